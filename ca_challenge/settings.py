@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'consumers.metrics.ServerTimingMiddleware',
+    'consumers.compression.NegotiatedGZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,20 +77,130 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'consumers.authentication.CachedJSONWebTokenAuthentication',
+    ),
+    # Token buckets of review creation and token issuance (see
+    # consumers.throttling), a missing scope isn't limited. The review rates
+    # count reviews (a bulk POST takes a token per item), so they hold at
+    # least REVIEWS_BULK_MAX_ITEMS.
+    'DEFAULT_THROTTLE_RATES': {
+        'review_create_user': '1000/hour',
+        'review_create_ip': '4000/hour',
+        'token_username': '10/min',
+        'token_ip': '30/min',
+    },
+    'PAGE_SIZE': 50,
+    # Picked by the Accept header, JSON when missing.
+    'DEFAULT_RENDERER_CLASSES': (
+        'consumers.renderers.RapidJSONRenderer',
+        'consumers.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'consumers.parsers.RapidJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
+# Smallest response (bytes) worth gzipping, for clients accepting it.
+GZIP_MIN_LENGTH = 1024
+
 WSGI_APPLICATION = 'ca_challenge.wsgi.application'
 
 
+# Reviews API
+
+# Maximum amount of reviews accepted by a single bulk POST.
+REVIEWS_BULK_MAX_ITEMS = 1000
+
+# Queue single review POSTs (202) for the process_review_queue worker
+# instead of inserting them during the request.
+REVIEWS_QUEUE_WRITES = False
+
+# Most ids accepted by a batch GET of reviews.
+REVIEWS_BATCH_MAX_IDS = 100
+
+# Longest wait (seconds) of a long polling request to the change feed.
+REVIEWS_FEED_MAX_WAIT = 30
+
+# Rows read per query while streaming review exports.
+REVIEWS_EXPORT_CHUNK_SIZE = 2000
+
+# Size and timeout (seconds) of the in-process cache of verified JWTs
+# (expired in every process when their user is saved or deleted).
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
+# Entries of the in-process cache of companies and name autocompletions
+# (expired in every process when a company is saved or deleted).
+COMPANY_CACHE_SIZE = 10000
+
+# Cache alias and timeout (seconds, 0 disables it) of review responses.
+REVIEWS_CACHE = 'default'
+REVIEWS_CACHE_TIMEOUT = 30
+# Timeout (seconds, 0 disables it) of the reviews cached per id for batch
+# GETs, in the REVIEWS_CACHE too.
+REVIEWS_ITEM_CACHE_TIMEOUT = 30
+
+# Cache alias of the throttle buckets (shared by the workers).
+THROTTLE_CACHE = 'default'
+
+# Aliases of the replicas serving review listings and details (empty to
+# read everything from "default"), and seconds a user who wrote keeps
+# reading from "default" (longer than the replication lag).
+REVIEWS_READ_DATABASES = []
+REVIEWS_READ_YOUR_WRITES_WINDOW = 10
+
+# Fraction (0 to 1) of API requests timed for the Server-Timing header and
+# the /api/_metrics histograms.
+METRICS_SAMPLE_RATE = 1.0
+
+
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
 
+# "replica" stands for a read replica of "default" (replication is set up
+# outside Django). Reads only go to the aliases in REVIEWS_READ_DATABASES.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
+        'CONN_MAX_AGE': 600,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db_replica.sqlite3')},
+        'CONN_MAX_AGE': 600,
+    },
+}
+
+# Pragmas run in this order on every new SQLite connection. WAL lets readers
+# run alongside a writer, and writers wait busy_timeout (ms) for the lock
+# instead of failing with "database is locked" (set first, so switching the
+# journal mode waits too). Negative cache_size is in KiB.
+
+SQLITE_PRAGMAS = (
+    ('busy_timeout', 5000),
+    ('journal_mode', 'wal'),
+    ('synchronous', 'normal'),
+    ('cache_size', -20000),
+    ('mmap_size', 268435456),
+)
+
+DATABASE_ROUTERS = ['consumers.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.10/topics/cache/
+# Use a shared backend (memcached, redis...) when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
@@ -17,13 +17,15 @@ from django.conf.urls import url, include
 from django.contrib import admin
 from consumers import views
 from rest_framework import routers
-from rest_framework_jwt.views import obtain_jwt_token
 
 router = routers.DefaultRouter()
 router.register(r"reviews", views.ReviewViewSet)
+router.register(r"submissions", views.ReviewSubmissionViewSet)
+router.register(r"companies", views.CompanyViewSet)
 
 urlpatterns = [
-    url(r'^api/token/auth/', obtain_jwt_token),
+    url(r'^api/token/auth/', views.ObtainJSONWebToken.as_view()),
+    url(r"^api/_metrics/$", views.MetricsView.as_view(), name="metrics"),
     url(r"^api/", include(router.urls)),
 
     url(r'^admin/', admin.site.urls),
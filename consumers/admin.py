@@ -1,13 +1,108 @@
+from datetime import datetime, timedelta
+
 from django.contrib import admin
-from consumers import models
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from consumers import models, search
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator counting `max_count` rows at most, so the count query stays
+    bounded on large tables (only the first `max_count` rows are paged, the
+    filters and search narrow down the rest).
+
+    """
+    max_count = 10000
+
+    # Override
+    @cached_property
+    def count(self):
+        return self.object_list[:self.max_count].count()
+
+
+def truncate_date(value, kind):
+    """ Start (aware, in the current time zone) of the period of `value`. """
+    value = timezone.make_naive(value)
+    start = {"year": value.replace(month=1, day=1),
+             "month": value.replace(day=1),
+             "day": value}[kind]
+    return timezone.make_aware(datetime.combine(start.date(),
+                                                datetime.min.time()))
+
+
+def next_period(start, kind):
+    """ Start of the period following the one starting at `start`. """
+    start = timezone.make_naive(start)
+    if kind == "year":
+        start = start.replace(year=start.year + 1)
+    elif kind == "month":
+        start = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    else:
+        start += timedelta(days=1)
+    return timezone.make_aware(start)
+
+
+class IndexedDatesQuerySet(models.ReviewQuerySet):
+    """
+    Review queryset listing the periods of the admin date hierarchy by
+    seeking the first review of each one through the date index, instead of
+    truncating the date of every review.
+
+    """
+
+    # Override
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        values = self.order_by(field_name).values_list(field_name, flat=True)
+        periods = []
+        first = values.first()
+        while first is not None:
+            periods.append(truncate_date(first, kind))
+            first = values.filter(**{
+                field_name + "__gte": next_period(periods[-1], kind)}).first()
+        return periods[::-1] if order == "DESC" else periods
 
 
 class ReviewAdmin(admin.ModelAdmin):
-    pass
+    list_display = ("title", "rating", "company", "reviewer",
+                    "submission_date")
+    list_select_related = ("company", "reviewer")
+    list_filter = ("rating",)
+    date_hierarchy = "submission_date"
+    search_fields = ("title", "summary")
+    raw_id_fields = ("company", "reviewer")
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    # Override
+    def get_queryset(self, request):
+        """
+        Overriding to list the date hierarchy through the date index.
+
+        """
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(model=queryset.model, query=queryset.query,
+                                    using=queryset._db)
+
+    # Override
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Overriding to search the full-text index (see `consumers.search`).
+
+        """
+        if not search_term.strip():
+            return queryset, False
+        return search.search(queryset, search_term), False
 
 
 class CompanyAdmin(admin.ModelAdmin):
-    pass
+    # Fully served by the name index (the admin adds "-pk" otherwise).
+    ordering = ("name", "id")
+    search_fields = ("^name",)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(models.Review, ReviewAdmin)
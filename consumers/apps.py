@@ -5,3 +5,6 @@ from django.apps import AppConfig
 
 class ConsumersConfig(AppConfig):
     name = 'consumers'
+
+    def ready(self):
+        from consumers import receivers  # noqa
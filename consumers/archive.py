@@ -0,0 +1,46 @@
+from django.db import connections, transaction
+
+from consumers import cache, models
+
+
+def archive(cutoff, batch_size, using="default"):
+    """
+    Moves the oldest reviews submitted before `cutoff` (`batch_size` at
+    most) to the archive table in one transaction, with one INSERT ...
+    SELECT and one DELETE. Returns the amount of reviews moved.
+
+    The reviews keep their ids, and they stay in the company stats and the
+    search index, so the deletion skips the review signals. The queued
+    submissions that created them lose their link (`review` is set to
+    NULL), the archive isn't referenced by other tables.
+
+    """
+    selected = models.Review.objects.using(using).filter(
+        submission_date__lt=cutoff).order_by("submission_date", "id")
+    selected = selected[:batch_size]
+    columns = ", ".join(field.column for field in
+                        models.Review._meta.concrete_fields)
+    ids_sql, params = selected.values("id").query.sql_with_params()
+
+    with transaction.atomic(using=using):
+        reviewer_ids = set(selected.values_list("reviewer_id", flat=True))
+        if not reviewer_ids:
+            return 0
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {0} ({2}) SELECT {2} FROM {1} "
+                "WHERE id IN ({3})".format(
+                    models.ArchivedReview._meta.db_table,
+                    models.Review._meta.db_table, columns, ids_sql),
+                params)
+            moved = cursor.rowcount
+            cursor.execute(
+                "UPDATE {} SET review_id = NULL "
+                "WHERE review_id IN ({})".format(
+                    models.ReviewSubmission._meta.db_table, ids_sql),
+                params)
+            cursor.execute("DELETE FROM {} WHERE id IN ({})".format(
+                models.Review._meta.db_table, ids_sql), params)
+        # Their listings change.
+        cache.invalidate(reviewer_ids, using=using)
+    return moved
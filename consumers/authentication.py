@@ -0,0 +1,160 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.encoding import force_bytes
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+from rest_framework_jwt.settings import api_settings
+
+from consumers import cache
+
+
+class TokenCache(object):
+    """
+    Thread safe LRU cache of authenticated users by token digest, whose
+    entries expire after a timeout (or with their token, when sooner).
+
+    Every entry belongs to a version of its user kept in the REVIEWS_CACHE,
+    which is replaced when the user is saved or deleted (see
+    `invalidate_user`), so every process drops the entry on the next lookup.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, user, version = entry
+            if expires <= time.monotonic():
+                self.entries.pop(key)
+                return None
+
+        if version != self.get_version(user.pk):
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    self.entries.pop(key)
+            return None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        return user
+
+    def set(self, key, user, timeout, version):
+        """
+        Caches `user` for `key`, with the `version` of the user read before
+        loading it (so a change made meanwhile isn't kept).
+
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, user, version)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def get_version(self, user_id):
+        """ Current version of a user (shared by every process). """
+        shared = cache.get_cache()
+        key = _version_key(user_id)
+        version = shared.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not shared.add(key, version, None):
+                version = shared.get(key, version)
+        return version
+
+    def invalidate_user(self, user_id, using="default"):
+        """
+        Expire the cached tokens of a user in every process.
+
+        The version is replaced right away and once more after the
+        transaction commits, so tokens cached while it was in flight aren't
+        kept.
+
+        """
+        def replace_version():
+            cache.get_cache().set(_version_key(user_id), uuid.uuid4().hex,
+                                  None)
+
+        replace_version()
+        transaction.on_commit(replace_version, using=using)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _version_key(user_id):
+    return "auth:version:{}".format(user_id)
+
+
+token_cache = TokenCache()
+
+
+class CachedJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """
+    JWT authentication that skips the signature verification and the user
+    query for tokens verified recently.
+
+    Entries are kept for `AUTH_TOKEN_CACHE_TIMEOUT` seconds at most (never
+    past the token expiration) and dropped by every process when their user
+    is saved or deleted, which covers deactivations and password changes.
+
+    """
+
+    # Override
+    def authenticate(self, request):
+        jwt_value = self.get_jwt_value(request)
+        if jwt_value is None:
+            return None
+
+        key = hashlib.sha256(force_bytes(jwt_value)).hexdigest()
+        user = token_cache.get(key)
+        if user is not None:
+            return (copy.copy(user), jwt_value)
+
+        self.payload, self.version = None, None
+        user, jwt_value = super().authenticate(request)
+        timeout = self.get_cache_timeout(self.payload)
+        if timeout > 0 and self.version is not None and (
+                str(user.pk) == str(self.get_user_id(self.payload))):
+            token_cache.set(key, copy.copy(user), timeout, self.version)
+        return (user, jwt_value)
+
+    # Override
+    def authenticate_credentials(self, payload):
+        """
+        Overriding to keep the verified payload for `authenticate`, and the
+        version of its user from before loading it.
+
+        """
+        self.payload = payload
+        user_id = self.get_user_id(payload)
+        if user_id is not None:
+            self.version = token_cache.get_version(user_id)
+        return super().authenticate_credentials(payload)
+
+    def get_user_id(self, payload):
+        """ Id of the user of a verified payload (None when unknown). """
+        if not isinstance(payload, dict):
+            return None
+        return api_settings.JWT_PAYLOAD_GET_USER_ID_HANDLER(payload)
+
+    def get_cache_timeout(self, payload):
+        """ Seconds the token can stay cached (0 for no caching). """
+        if not isinstance(payload, dict):
+            return 0
+        timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+        if "exp" in payload:
+            timeout = min(timeout, payload["exp"] - time.time())
+        return timeout
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from consumers import models, search
+
+
+def delete_seeded(prefix):
+    """
+    Deletes the companies and users whose name starts with `prefix` and
+    their reviews, with their stats and search entries (the data seeded by
+    a benchmark command, also the one left by an interrupted run).
+
+    """
+    users = User.objects.filter(username__startswith=prefix)
+    reviews = models.Review.objects.filter(reviewer__in=users)
+    ids_sql, params = reviews.values("id").query.sql_with_params()
+    with transaction.atomic():
+        review_ids = list(reviews.values_list("id", flat=True))
+        # One DELETE instead of the signals of every review: their stats go
+        # along with the benchmark companies.
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {} WHERE id IN ({})".format(
+                models.Review._meta.db_table, ids_sql), params)
+        search.unindex(review_ids)
+        models.Company.objects.filter(name__startswith=prefix).delete()
+        users.delete()
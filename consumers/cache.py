@@ -0,0 +1,203 @@
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def get_cache():
+    return caches[settings.REVIEWS_CACHE]
+
+
+def _version_key(user_id):
+    return "reviews:version:{}".format(user_id)
+
+
+def get_version(user_id):
+    """ Version of the cached responses of a user. """
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(_version_key(user_id), version, None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def invalidate(user_ids, using="default"):
+    """
+    Expire the cached responses of the given users.
+
+    The version is replaced right away and once more after the transaction
+    commits, so a response cached while it was in flight isn't kept.
+
+    """
+    user_ids = set(user_ids)
+
+    def replace_versions():
+        get_cache().set_many(dict((_version_key(user_id), uuid.uuid4().hex)
+                                  for user_id in user_ids), None)
+
+    replace_versions()
+    transaction.on_commit(replace_versions, using=using)
+
+
+def wait_for_change(user_id, version, timeout, interval=0.25):
+    """
+    Waits up to `timeout` seconds for the reviews of a user to change (from
+    the `version` of its cached responses, replaced on every change by any
+    worker). Returns whether they changed.
+
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(min(interval, max(0, deadline - time.monotonic())))
+        if get_version(user_id) != version:
+            return True
+    return False
+
+
+def _written_key(user_id):
+    return "reviews:written:{}".format(user_id)
+
+
+def mark_written(user_ids):
+    """
+    Remember the given users wrote reviews, for the read-your-writes window
+    (see `consumers.routers.ReplicaReadMixin`).
+
+    """
+    timeout = settings.REVIEWS_READ_YOUR_WRITES_WINDOW
+    if timeout:
+        get_cache().set_many(
+            dict((_written_key(user_id), True) for user_id in set(user_ids)),
+            timeout)
+
+
+def recently_written(user_id):
+    """ Whether the user wrote reviews within the read-your-writes window. """
+    if not settings.REVIEWS_READ_YOUR_WRITES_WINDOW:
+        return False
+    return get_cache().get(_written_key(user_id), False)
+
+
+def _item_keys(user, variant, review_ids):
+    parts = [str(user.pk), user.date_joined.isoformat(), get_version(user.pk),
+             variant]
+    digest = hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+    return dict((review_id, "reviews:item:{}:{}".format(digest, review_id))
+                for review_id in review_ids)
+
+
+def get_items(user, variant, review_ids):
+    """
+    Cached representations (as `variant`, e.g. serializer and fields) of
+    the given reviews for a user, by id. Expired along with the responses.
+
+    """
+    if not settings.REVIEWS_ITEM_CACHE_TIMEOUT:
+        return {}
+    keys = _item_keys(user, variant, review_ids)
+    cached = get_cache().get_many(list(keys.values()))
+    return dict((review_id, cached[key]) for review_id, key in keys.items()
+                if key in cached)
+
+
+def set_items(user, variant, items):
+    """ Caches the representations of reviews (see `get_items`). """
+    if not settings.REVIEWS_ITEM_CACHE_TIMEOUT or not items:
+        return
+    keys = _item_keys(user, variant, items)
+    get_cache().set_many(
+        dict((keys[review_id], data) for review_id, data in items.items()),
+        settings.REVIEWS_ITEM_CACHE_TIMEOUT)
+
+
+def normalize_params(query_params):
+    """ Sorted query params without blank values. """
+    return sorted((key, value)
+                  for key in query_params
+                  for value in query_params.getlist(key)
+                  if value != "")
+
+
+def make_etag(data, media_type):
+    """ Strong ETag of the representation of `data` as `media_type`. """
+    content = json.dumps(data, cls=JSONEncoder, sort_keys=True,
+                         separators=(",", ":"))
+    digest = hashlib.sha1(media_type.encode("utf-8"))
+    digest.update(content.encode("utf-8"))
+    return quote_etag(digest.hexdigest())
+
+
+class CachedResponseMixin(object):
+    """
+    Caches successful responses per user, serializer class and normalized
+    query params, tagging them with an ETag so polls whose `If-None-Match`
+    matches are answered with a 304 without serializing again.
+
+    Responses of a user are invalidated when reviews are created for them
+    (see `consumers.receivers`).
+
+    """
+
+    def get_cache_key(self, request):
+        user = request.user
+        parts = [
+            request.build_absolute_uri(request.path),
+            str(user.pk),
+            user.date_joined.isoformat(),
+            get_version(user.pk),
+            self.get_serializer_class().__name__,
+            request.accepted_media_type,
+            normalize_params(request.query_params),
+        ]
+        digest = hashlib.sha1(json.dumps(parts).encode("utf-8"))
+        return "reviews:response:{}".format(digest.hexdigest())
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """
+        Returns the cached response of `handler` (or calls and caches it).
+
+        """
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = (make_etag(response.data, request.accepted_media_type),
+                     response.data)
+            if settings.REVIEWS_CACHE_TIMEOUT:
+                cache.set(key, entry, settings.REVIEWS_CACHE_TIMEOUT)
+        else:
+            response = Response(entry[1])
+
+        etag = entry[0]
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match:
+            # The gzip middleware tags the ETags of compressed responses.
+            etags = [tag[:-len(";gzip")] if tag.endswith(";gzip") else tag
+                     for tag in parse_etags(if_none_match)]
+            if "*" in etags or etag.strip('"') in etags:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        response["ETag"] = etag
+        return response
+
+    # Override
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    # Override
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,149 @@
+import copy
+import string
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.expressions import RawSQL
+
+from consumers import cache, models
+
+
+VERSION_KEY = "companies:version"
+
+# Case folding of SQLite's NOCASE and LIKE, which only fold ASCII letters.
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def autocomplete_queryset(prefix, using="default"):
+    """
+    Companies whose name starts with `prefix` (ignoring case), sorted by
+    name, served by the NOCASE index of the name on SQLite.
+
+    """
+    queryset = models.Company.objects.using(using)
+    if prefix:
+        queryset = queryset.filter(name__istartswith=prefix)
+    if connections[using].vendor == "sqlite":
+        name = RawSQL('"{}"."name" COLLATE NOCASE'.format(
+            models.Company._meta.db_table), ())
+        return queryset.order_by(name, "id")
+    return queryset.order_by("name", "id")
+
+
+class CompanyCache(object):
+    """
+    Thread safe LRU cache of companies (by id) and of name autocompletions
+    (by prefix), for the "default" database.
+
+    Every entry belongs to a version of the companies kept in the
+    REVIEWS_CACHE, which is replaced when any company is saved or deleted
+    (see `invalidate`), so every process drops its entries on the next
+    lookup.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.entries = OrderedDict()
+
+    def get_many(self, company_ids):
+        """
+        Companies of the given ids (the missing ones are left out), loading
+        the uncached ones in a single query.
+
+        """
+        company_ids = set(company_ids)
+        version = self.get_version()
+        companies = {}
+        with self.lock:
+            self._sync(version)
+            for company_id in company_ids:
+                company = self._get(("id", company_id))
+                if company is not None:
+                    companies[company_id] = company
+
+        missing = company_ids.difference(companies)
+        if missing:
+            loaded = models.Company.objects.in_bulk(list(missing))
+            with self.lock:
+                self._sync(version)
+                for company_id, company in loaded.items():
+                    self._set(("id", company_id), company)
+            companies.update(loaded)
+        return dict((company_id, copy.copy(company))
+                    for company_id, company in companies.items())
+
+    def get(self, company_id):
+        """ Company of the given id, or None when missing. """
+        return self.get_many([company_id]).get(company_id)
+
+    def autocomplete(self, prefix, limit):
+        """ First `limit` companies whose name starts with `prefix`. """
+        # Prefixes matching the same companies share the entry.
+        key = ("prefix", prefix.translate(ASCII_LOWER), limit)
+        version = self.get_version()
+        with self.lock:
+            self._sync(version)
+            companies = self._get(key)
+        if companies is None:
+            companies = list(autocomplete_queryset(prefix)[:limit])
+            with self.lock:
+                self._sync(version)
+                self._set(key, companies)
+                for company in companies:
+                    self._set(("id", company.pk), company)
+        return [copy.copy(company) for company in companies]
+
+    def get_version(self):
+        """ Current version of the companies (shared by every process). """
+        shared = cache.get_cache()
+        version = shared.get(VERSION_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not shared.add(VERSION_KEY, version, None):
+                version = shared.get(VERSION_KEY, version)
+        return version
+
+    def invalidate(self, using="default"):
+        """
+        Expire the cached companies in every process.
+
+        The version is replaced right away and once more after the
+        transaction commits, so companies cached while it was in flight
+        aren't kept.
+
+        """
+        def replace_version():
+            cache.get_cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+            self.clear()
+
+        replace_version()
+        transaction.on_commit(replace_version, using=using)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _sync(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def _get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def _set(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > settings.COMPANY_CACHE_SIZE:
+            self.entries.popitem(last=False)
+
+
+company_cache = CompanyCache()
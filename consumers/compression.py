@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an `Accept-Encoding` header lists gzip with a non-zero q-value
+    (`gzip;q=0` refuses it).
+
+    """
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get("gzip", 0.0) > 0
+
+
+class NegotiatedGZipMiddleware(GZipMiddleware):
+    """
+    Gzips the responses of at least `GZIP_MIN_LENGTH` bytes (streamed ones
+    always) for clients whose `Accept-Encoding` accepts it.
+
+    Place it right after the timing middleware, so the compression is
+    timed but runs after any middleware that reads the content.
+
+    """
+
+    # Override
+    def process_response(self, request, response):
+        if (not response.streaming and
+                len(response.content) < settings.GZIP_MIN_LENGTH):
+            return response
+        if not accepts_gzip(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            if not response.has_header("Content-Encoding"):
+                patch_vary_headers(response, ("Accept-Encoding",))
+            return response
+        return super().process_response(request, response)
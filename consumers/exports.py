@@ -0,0 +1,52 @@
+import csv
+import json
+
+from consumers.pagination import (
+    keyset_filter, keyset_ordering, with_ordering_columns)
+
+
+def iter_rows(queryset, chunk_size):
+    """
+    Yields the rows of a `values()` queryset, reading them in chunks of
+    `chunk_size` that seek from the last row read, so memory use doesn't
+    depend on the size of the queryset.
+
+    """
+    ordering = keyset_ordering(queryset)
+    keys = [order.lstrip("-") for order in ordering]
+    queryset = with_ordering_columns(queryset.order_by(*ordering), ordering)
+
+    chunk = queryset
+    while True:
+        rows = list(chunk[:chunk_size])
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        position = [rows[-1][key] for key in keys]
+        chunk = queryset.filter(keyset_filter(ordering, position))
+
+
+def iter_ndjson(rows, serializer):
+    for row in rows:
+        yield json.dumps(serializer.to_representation(row)) + "\n"
+
+
+class Echo(object):
+    """ File-like object returning what is written (for `csv.writer`). """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, serializer):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _, _ in serializer.plan])
+    for row in rows:
+        yield writer.writerow(serializer.to_representation(row).values())
+
+
+FORMATS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+}
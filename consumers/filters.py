@@ -1,7 +1,24 @@
 from rest_framework import filters
 
+from consumers import search
+
 
 class ReviewEndpointFilterBackend(filters.BaseFilterBackend):
 
     def filter_queryset(self, request, queryset, view):
         return queryset.filter(reviewer=request.user)
+
+
+class ReviewSearchFilterBackend(filters.BaseFilterBackend):
+    """
+    Keeps the reviews matching the `search` param, most relevant first
+    (unless an explicit `ordering` is applied after this backend).
+
+    """
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, "").strip()
+        if not text:
+            return queryset
+        return search.search(queryset, text).order_by("rank")
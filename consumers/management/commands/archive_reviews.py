@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from consumers import archive
+
+
+class Command(BaseCommand):
+    help = ("Moves the reviews submitted more than --older-than days ago to "
+            "the archive table, in batched transactions. The API reads the "
+            "archive only for reviews asked by id, with include_archived or "
+            "with a date range reaching archived reviews.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, required=True,
+                            help="Age in days of the reviews to archive.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--database", default="default",
+            help="Database of the reviews and the archive.")
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 0:
+            raise CommandError("The age can't be negative.")
+        if options["batch_size"] < 1:
+            raise CommandError("The batch size must be positive.")
+
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+        total = 0
+        while True:
+            moved = archive.archive(cutoff, options["batch_size"],
+                                    using=options["database"])
+            if not moved:
+                break
+            total += moved
+            self.stdout.write("Archived {} reviews.".format(total))
+        self.stdout.write("Archived {} reviews submitted before {}.".format(
+            total, cutoff.isoformat()))
@@ -0,0 +1,60 @@
+import json
+import timeit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+from rest_framework_jwt.settings import api_settings
+
+from consumers.authentication import (
+    CachedJSONWebTokenAuthentication, token_cache)
+
+
+class Command(BaseCommand):
+    help = ("Measures the authentication overhead per request of the stock "
+            "and the cached JWT authentication (output as JSON).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        # The benchmark user is rolled back when done.
+        with transaction.atomic():
+            user = User.objects.create_user(
+                "bench_auth_user", password="bench_auth_user")
+            token = api_settings.JWT_ENCODE_HANDLER(
+                api_settings.JWT_PAYLOAD_HANDLER(user))
+            request = APIRequestFactory().get(
+                "/", HTTP_AUTHORIZATION="JWT {}".format(token))
+
+            results = {}
+            for name, authentication in (
+                    ("stock", JSONWebTokenAuthentication),
+                    ("cached", CachedJSONWebTokenAuthentication)):
+                token_cache.clear()
+                results[name] = self.measure(
+                    authentication, request,
+                    options["iterations"], options["repeat"])
+
+            transaction.set_rollback(True)
+
+        results["iterations"] = options["iterations"]
+        results["speedup"] = round(
+            results["stock"]["best_us"] / results["cached"]["best_us"], 2)
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def measure(self, authentication, request, iterations, repeat):
+        """ Microseconds per authentication (best and mean of the runs). """
+        def authenticate():
+            user, _ = authentication().authenticate(Request(request))
+            if user is None or user.username != "bench_auth_user":
+                raise CommandError("The benchmark token wasn't accepted.")
+
+        timings = [timing / iterations * 1e6 for timing in timeit.repeat(
+            authenticate, number=iterations, repeat=repeat)]
+        return {"best_us": round(min(timings), 2),
+                "mean_us": round(sum(timings) / len(timings), 2)}
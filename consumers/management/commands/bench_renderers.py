@@ -0,0 +1,87 @@
+import json
+import random
+import timeit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from consumers import models, renderers, serializers
+
+
+RENDERERS = (
+    ("json", JSONRenderer),
+    ("rapidjson", renderers.RapidJSONRenderer),
+    ("msgpack", renderers.MessagePackRenderer),
+)
+
+WORDS = ("great", "service", "price", "slow", "support", "quality", "staff",
+         "delivery", "would", "recommend", "never", "again", "friendly",
+         "product", "order", "refund", "excellent", "poor", "fast", "the")
+
+
+class Command(BaseCommand):
+    help = ("Compares the time to render listing pages of reviews with long "
+            "summaries and their size on the wire (plain and gzipped) per "
+            "renderer.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-sizes", type=int, nargs="+",
+                            default=[50, 500])
+        parser.add_argument("--summary-length", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        results = {}
+        # The benchmark data is rolled back when done.
+        with transaction.atomic():
+            user = User.objects.create_user("bench_renderers_user")
+            company = models.Company.objects.create(name="Bench Company")
+            text = random.Random(0)
+            models.Review.objects.bulk_create(
+                models.Review(rating=index % 5 + 1,
+                              title="Review {}".format(index),
+                              summary=self.summary(
+                                  text, options["summary_length"]),
+                              ip_address="123.123.123.123",
+                              company=company,
+                              reviewer=user)
+                for index in range(max(options["page_sizes"])))
+
+            queryset = serializers.ReviewValuesSerializer.setup_eager_loading(
+                models.Review.objects.filter(reviewer=user).order_by(
+                    "-submission_date", "-id"))
+            for size in sorted(options["page_sizes"]):
+                data = {"next": None, "previous": None,
+                        "results": serializers.ReviewValuesSerializer(
+                            list(queryset[:size]), many=True).data}
+                results[size] = dict(
+                    (name, self.measure(renderer_class(), data,
+                                        options["repeat"]))
+                    for name, renderer_class in RENDERERS)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def summary(self, text, length):
+        """ Random words adding up to `length` characters. """
+        words = []
+        while sum(len(word) + 1 for word in words) < length:
+            words.append(text.choice(WORDS))
+        return " ".join(words)[:length]
+
+    def measure(self, renderer, data, repeat):
+        """ Best milliseconds to render `data`, and its size. """
+        content = renderer.render(data, renderer.media_type)
+        timing = min(timeit.repeat(
+            lambda: renderer.render(data, renderer.media_type),
+            number=1, repeat=repeat)) * 1000
+        gzip_timing = min(timeit.repeat(
+            lambda: compress_string(content), number=1, repeat=repeat)) * 1000
+        return {"render_ms": round(timing, 1),
+                "bytes": len(content),
+                "gzip_ms": round(gzip_timing, 1),
+                "gzip_bytes": len(compress_string(content))}
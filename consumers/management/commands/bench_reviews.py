@@ -0,0 +1,210 @@
+import bisect
+import itertools
+import json
+import random
+import time
+
+from django.conf import settings as django_settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework_jwt.settings import api_settings
+
+from consumers import benchmarks, models
+
+
+PREFIX = "bench_reviews_"
+
+
+def percentile(timings, percent):
+    """ Nearest rank percentile of sorted `timings`. """
+    index = max(0, int(round(percent / 100.0 * len(timings))) - 1)
+    return timings[min(index, len(timings) - 1)]
+
+
+class Command(BaseCommand):
+    help = ("Measures the latency, throughput and SQL queries of the reviews "
+            "API through the whole middleware and authentication stack, on "
+            "a seeded dataset that is deleted when done (output as JSON). "
+            "Every request commits as in production, so run it against a "
+            "scratch copy of the database. Fails when a baseline is given "
+            "and a scenario regresses past the threshold.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--companies", type=int, default=20)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--reviews", type=int, default=10000)
+        parser.add_argument(
+            "--skew", type=float, default=1.0,
+            help="Zipf exponent spreading the reviews over users and "
+                 "companies (0 for uniform).")
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Measured requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--cache", action="store_true",
+            help="Keep the response cache on (off by default, so every "
+                 "request is served by the view).")
+        parser.add_argument(
+            "--baseline",
+            help="JSON output of a previous run to compare against.")
+        parser.add_argument(
+            "--threshold", type=float, default=10.0,
+            help="Allowed p95 increase over the baseline, in percent.")
+
+    def handle(self, *args, **options):
+        settings = {"DEBUG": False, "ALLOWED_HOSTS": ["localhost"],
+                    # Measure the views, not the throttled responses.
+                    "REST_FRAMEWORK": dict(django_settings.REST_FRAMEWORK,
+                                           DEFAULT_THROTTLE_RATES={})}
+        if not options["cache"]:
+            settings["REVIEWS_CACHE_TIMEOUT"] = 0
+
+        # Not in a transaction: the requests commit (and run their commit
+        # hooks) as in production, and the data is deleted when done.
+        benchmarks.delete_seeded(PREFIX)
+        try:
+            with override_settings(**settings):
+                user = self.seed(options)
+                scenarios = self.get_scenarios(user)
+                client = Client(HTTP_HOST="localhost",
+                                HTTP_AUTHORIZATION="JWT {}".format(
+                                    api_settings.JWT_ENCODE_HANDLER(
+                                        api_settings.JWT_PAYLOAD_HANDLER(
+                                            user))))
+                results = dict(
+                    (name, self.measure(client, requests, options))
+                    for name, requests in scenarios)
+        finally:
+            benchmarks.delete_seeded(PREFIX)
+
+        report = {
+            "config": dict((name, options[name]) for name in (
+                "companies", "users", "reviews", "skew", "requests",
+                "warmup", "seed", "cache")),
+            "scenarios": results,
+        }
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                regressions = self.compare(
+                    json.load(baseline), report, options["threshold"])
+            if regressions:
+                raise CommandError("Regressions: {}".format(
+                    "; ".join(regressions)))
+
+    def seed(self, options):
+        """
+        Creates the companies, users and reviews. Returns the user with the
+        most reviews, which the requests are authenticated as.
+
+        """
+        rand = random.Random(options["seed"])
+        models.Company.objects.bulk_create(
+            models.Company(name="{}{}".format(PREFIX, index))
+            for index in range(options["companies"]))
+        User.objects.bulk_create(
+            User(username="{}{}".format(PREFIX, index),
+                 password=make_password(None))
+            for index in range(options["users"]))
+        companies = list(models.Company.objects.filter(
+            name__startswith=PREFIX).order_by("id"))
+        users = list(User.objects.filter(
+            username__startswith=PREFIX).order_by("id"))
+
+        weights = list(itertools.accumulate(
+            1.0 / (rank + 1) ** options["skew"]
+            for rank in range(max(len(users), len(companies)))))
+
+        def pick(choices):
+            total = weights[len(choices) - 1]
+            index = bisect.bisect(weights, rand.random() * total)
+            return choices[min(index, len(choices) - 1)]
+
+        models.Review.objects.bulk_create(
+            (models.Review(rating=rand.randint(1, 5),
+                           title="Review {}".format(index),
+                           summary="Summary of review {}.".format(index),
+                           ip_address="123.123.123.123",
+                           company=pick(companies),
+                           reviewer=pick(users))
+             for index in range(options["reviews"])),
+            batch_size=500)
+        return users[0]
+
+    def get_scenarios(self, user):
+        """ Pairs of name and endless iterator of requests to send. """
+        url = reverse("review-list")
+        review_ids = list(models.Review.objects.filter(
+            reviewer=user).values_list("id", flat=True)[:1000])
+        company = models.Company.objects.filter(
+            name__startswith=PREFIX).order_by("id")[0]
+        payload = json.dumps({"rating": 4,
+                              "title": "Benchmark review",
+                              "summary": "Created by the benchmark.",
+                              "company": company.id})
+
+        def get(path, params=None):
+            return lambda client: client.get(path, params)
+
+        return (
+            ("list", itertools.repeat(get(url))),
+            ("nested_list", itertools.repeat(get(url, {"nested": 1}))),
+            ("filtered_list", itertools.repeat(get(
+                url, {"company": company.id, "rating__gte": 3}))),
+            ("retrieve", itertools.cycle([
+                get(reverse("review-detail", args=[review_id]))
+                for review_id in review_ids])),
+            ("create", itertools.repeat(lambda client: client.post(
+                url, payload, content_type="application/json"))),
+        )
+
+    def measure(self, client, requests, options):
+        """ Latency percentiles (ms), throughput and queries per request. """
+        for _ in range(options["warmup"]):
+            next(requests)(client)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = next(requests)(client)
+        # Read now, every request resets the connection query log.
+        query_count = len(queries.captured_queries)
+        if response.status_code >= 400:
+            raise CommandError("Unexpected status {}: {}".format(
+                response.status_code, response.content[:200]))
+
+        timings = []
+        for _ in range(options["requests"]):
+            send = next(requests)
+            start = time.perf_counter()
+            send(client)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        return {"p50_ms": round(percentile(timings, 50), 2),
+                "p95_ms": round(percentile(timings, 95), 2),
+                "p99_ms": round(percentile(timings, 99), 2),
+                "throughput_rps": round(len(timings) * 1000 / sum(timings), 1),
+                "queries": query_count,
+                "status": response.status_code}
+
+    def compare(self, baseline, report, threshold):
+        """ Descriptions of the scenarios slower or running more queries. """
+        regressions = []
+        for name, current in sorted(report["scenarios"].items()):
+            previous = baseline.get("scenarios", {}).get(name)
+            if previous is None:
+                continue
+            limit = previous["p95_ms"] * (1 + threshold / 100.0)
+            if current["p95_ms"] > limit:
+                regressions.append("{} p95 {}ms > {}ms".format(
+                    name, current["p95_ms"], round(limit, 2)))
+            if current["queries"] > previous["queries"]:
+                regressions.append("{} queries {} > {}".format(
+                    name, current["queries"], previous["queries"]))
+        return regressions
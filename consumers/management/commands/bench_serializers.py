@@ -0,0 +1,83 @@
+import json
+import timeit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from consumers import models, serializers
+
+
+SHAPES = (
+    ("flat", serializers.ReviewSerializer,
+     serializers.ReviewValuesSerializer),
+    ("nested", serializers.ReviewNestedSerializer,
+     serializers.ReviewNestedValuesSerializer),
+)
+
+
+class Command(BaseCommand):
+    help = ("Compares listing the reviews with the model serializers and "
+            "with the values serializers (output as JSON).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+",
+                            default=[1000, 10000])
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        results = {}
+        # The benchmark data is rolled back when done.
+        with transaction.atomic():
+            user = User.objects.create_user(
+                "bench_serializers_user", first_name="Bench", last_name="User",
+                email="bench@example.com")
+            company = models.Company.objects.create(name="Bench Company")
+
+            created = 0
+            for size in sorted(options["sizes"]):
+                models.Review.objects.bulk_create(
+                    models.Review(rating=index % 5 + 1,
+                                  title="Review {}".format(index),
+                                  summary="Summary of review {}.".format(
+                                      index) * 10,
+                                  ip_address="123.123.123.123",
+                                  company=company,
+                                  reviewer=user)
+                    for index in range(created, size))
+                created = size
+                queryset = models.Review.objects.filter(
+                    reviewer=user).order_by("-submission_date", "-id")
+                results[size] = dict(
+                    (shape, self.measure(queryset, model_serializer,
+                                         values_serializer,
+                                         options["repeat"]))
+                    for shape, model_serializer, values_serializer in SHAPES)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def measure(self, queryset, model_serializer, values_serializer, repeat):
+        """ Best milliseconds to query, serialize and render every row. """
+        renderer = JSONRenderer()
+
+        def render(serializer_class):
+            eager_loading = getattr(
+                serializer_class, "setup_eager_loading", None)
+            rows = eager_loading(queryset) if eager_loading else queryset
+            return renderer.render(serializer_class(rows, many=True).data)
+
+        if render(model_serializer) != render(values_serializer):
+            raise CommandError("The {} and {} outputs differ.".format(
+                model_serializer.__name__, values_serializer.__name__))
+        timings = dict(
+            (name, min(timeit.repeat(
+                lambda: render(serializer_class),
+                number=1, repeat=repeat)) * 1000)
+            for name, serializer_class in (("model", model_serializer),
+                                           ("values", values_serializer)))
+        return {"model_ms": round(timings["model"], 1),
+                "values_ms": round(timings["values"], 1),
+                "speedup": round(timings["model"] / timings["values"], 2)}
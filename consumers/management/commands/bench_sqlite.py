@@ -0,0 +1,154 @@
+import json
+import multiprocessing
+import time
+
+from django.conf import settings as django_settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework_jwt.settings import api_settings
+
+from consumers import benchmarks, models
+
+
+PREFIX = "bench_sqlite_"
+
+# Pragmas replaced in the SQLITE_PRAGMAS for each measured journal.
+JOURNALS = (
+    ("rollback", {"journal_mode": "delete", "synchronous": "full"}),
+    ("configured", {}),
+)
+
+
+def work(token, write, requests, url, payload, results):
+    """
+    Sends the requests of a worker process (creating or listing reviews)
+    and puts its unexpected responses or errors in `results`.
+
+    """
+    client = Client(HTTP_HOST="localhost",
+                    HTTP_AUTHORIZATION="JWT {}".format(token))
+    errors = []
+    try:
+        for _ in range(requests):
+            if write:
+                response = client.post(url, payload,
+                                       content_type="application/json")
+            else:
+                response = client.get(url, {"page_size": 100})
+            if response.status_code not in (200, 201):
+                errors.append(response.status_code)
+    except Exception as error:
+        errors.append(repr(error))
+    finally:
+        connection.close()
+        results.put(errors)
+
+
+class Command(BaseCommand):
+    help = ("Compares the throughput of parallel review writers and readers, "
+            "each in a forked process like the WSGI workers, on the rollback "
+            "journal and on the configured SQLITE_PRAGMAS (output as JSON). "
+            "Every request commits, so run it against a scratch copy of the "
+            "database; the seeded data is deleted when done.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--requests", type=int, default=30,
+                            help="Requests per worker.")
+        parser.add_argument("--reviews", type=int, default=300)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The database isn't SQLite.")
+        settings = {"DEBUG": False, "ALLOWED_HOSTS": ["localhost"],
+                    # Measure the views, not the throttled responses.
+                    "REST_FRAMEWORK": dict(django_settings.REST_FRAMEWORK,
+                                           DEFAULT_THROTTLE_RATES={})}
+
+        benchmarks.delete_seeded(PREFIX)
+        try:
+            with override_settings(**settings):
+                tokens, payload = self.seed(options)
+                results = dict(
+                    (name, self.measure(self.pragmas(overrides), tokens,
+                                        payload, options))
+                    for name, overrides in JOURNALS)
+        finally:
+            # Back to the configured journal.
+            connection.close()
+            benchmarks.delete_seeded(PREFIX)
+
+        results["speedup"] = round(results["configured"]["throughput_rps"] /
+                                   results["rollback"]["throughput_rps"], 2)
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def pragmas(self, overrides):
+        return tuple((name, overrides.get(name, value))
+                     for name, value in django_settings.SQLITE_PRAGMAS)
+
+    def seed(self, options):
+        """
+        Creates the users (writers first) and reviews. Returns the tokens of
+        the users and the payload of the created reviews.
+
+        """
+        company = models.Company.objects.create(name="{}company".format(
+            PREFIX))
+        User.objects.bulk_create(
+            User(username="{}{}".format(PREFIX, index),
+                 password=make_password(None))
+            for index in range(options["writers"] + options["readers"]))
+        users = list(User.objects.filter(
+            username__startswith=PREFIX).order_by("id"))
+        models.Review.objects.bulk_create(
+            (models.Review(rating=index % 5 + 1,
+                           title="Review {}".format(index),
+                           summary="Summary of review {}.".format(index),
+                           ip_address="123.123.123.123",
+                           company=company,
+                           reviewer=users[index % len(users)])
+             for index in range(options["reviews"])),
+            batch_size=500)
+        tokens = [api_settings.JWT_ENCODE_HANDLER(
+            api_settings.JWT_PAYLOAD_HANDLER(user)) for user in users]
+        payload = json.dumps({"rating": 4,
+                              "title": "Benchmark review",
+                              "summary": "Created by the benchmark.",
+                              "company": company.id})
+        return tokens, payload
+
+    def measure(self, pragmas, tokens, payload, options):
+        """ Journal mode, throughput and errors of a run of the workers. """
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            # Switch the journal (persistent) before forking, so the
+            # workers don't share the connection.
+            connection.close()
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                journal_mode = cursor.fetchone()[0]
+            connection.close()
+
+            context = multiprocessing.get_context("fork")
+            results = context.Queue()
+            workers = [context.Process(target=work, args=(
+                token, index < options["writers"], options["requests"],
+                reverse("review-list"), payload, results))
+                for index, token in enumerate(tokens)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            errors = sum((results.get() for _ in workers), [])
+            elapsed = time.perf_counter() - start
+            for worker in workers:
+                worker.join()
+
+        return {"journal_mode": journal_mode,
+                "throughput_rps": round(
+                    len(workers) * options["requests"] / elapsed, 1),
+                "errors": errors}
@@ -0,0 +1,276 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_ipv46_address
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from consumers import cache, models, search
+from consumers.companies import company_cache
+
+
+FIELDS = ("rating", "title", "summary", "ip_address", "company", "reviewer",
+          "submission_date")
+
+
+def read_csv(stream):
+    return csv.DictReader(stream)
+
+
+def read_ndjson(stream):
+    for line in stream:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None  # Skipped as invalid, like any other bad row.
+
+
+def parse_rating(value):
+    """ Rating of a row value, which must be integral (not 4.7 or True). """
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return value
+    elif isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise ValueError("invalid rating {!r}".format(value))
+
+
+def chunks(values, size=500):
+    """ Slices of `values` small enough for an `IN` on any SQLite. """
+    return (values[index:index + size]
+            for index in range(0, len(values), size))
+
+
+READERS = {
+    ".csv": read_csv,
+    ".ndjson": read_ndjson,
+    ".jsonl": read_ndjson,
+}
+
+
+class Command(BaseCommand):
+    help = ("Loads reviews from a CSV or NDJSON file in batched transactions, "
+            "resuming after the last loaded batch when run again. Each row "
+            "has: {} (company name and reviewer username; missing companies "
+            "are created, submission_date is optional).".format(
+                ", ".join(FIELDS)))
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"],
+                            help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--database", default="default",
+            help="Database to load the reviews on.")
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Load the file from the start, ignoring the progress saved "
+                 "by a previous run.")
+        parser.add_argument(
+            "--rebuild-after", action="store_true",
+            help="Skip updating the company stats and the search index on "
+                 "every batch and rebuild them once the file is loaded "
+                 "(faster for large files).")
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options["path"])
+        if options["format"]:
+            reader = READERS["." + options["format"]]
+        else:
+            reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError("Unknown file format, use --format.")
+        if options["batch_size"] < 1:
+            raise CommandError("The batch size must be positive.")
+
+        self.using = options["database"]
+        self.notify = not options["rebuild_after"]
+        self.companies = dict(models.Company.objects.using(
+            self.using).order_by("-id").values_list("name", "id"))
+        self.users = {}
+        self.skipped = 0
+
+        progress, _ = models.ReviewLoad.objects.using(
+            self.using).get_or_create(source=path)
+        if options["restart"]:
+            progress.rows = progress.loaded = 0
+        resumed_at = progress.rows
+
+        start = time.time()
+        with open(path, newline="", encoding="utf-8") as stream:
+            rows = itertools.islice(enumerate(reader(stream), 1),
+                                    progress.rows, None)
+            while True:
+                batch = list(itertools.islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                self.load(batch, progress)
+                self.report(progress, resumed_at, start)
+
+        if not self.notify:
+            self.stdout.write("Rebuilding company stats and search index...")
+            models.CompanyStats.objects.using(self.using).rebuild()
+            search.rebuild(self.using)
+            cache.invalidate(
+                [user_id for user_id in self.users.values() if user_id],
+                using=self.using)
+
+        self.stdout.write(
+            "Loaded {} reviews from {} rows ({} skipped).".format(
+                progress.loaded, progress.rows, self.skipped))
+
+    def load(self, batch, progress):
+        """
+        Inserts a batch of (line, row) and saves the progress, all in one
+        transaction so a crash never loads a batch twice.
+
+        """
+        with transaction.atomic(using=self.using):
+            self.resolve_users([row for _, row in batch])
+            reviews = []
+            for line, row in batch:
+                try:
+                    if not isinstance(row, dict):
+                        raise ValueError("not a review")
+                    reviews.append(self.build(row))
+                except (KeyError, TypeError, ValueError) as error:
+                    self.skipped += 1
+                    self.stderr.write("Row {}: skipped ({}).".format(
+                        line, error))
+            # Only the companies of the valid rows are created.
+            self.resolve_companies(
+                [review.company_name for review in reviews])
+            for review in reviews:
+                review.company_id = self.companies[review.company_name]
+            if self.notify:
+                models.Review.objects.using(self.using).bulk_create(reviews)
+            else:
+                self.insert(reviews)
+
+            progress.rows = batch[-1][0]
+            progress.loaded += len(reviews)
+            progress.save(using=self.using)
+
+    def insert(self, reviews):
+        """
+        Inserts the reviews with a single prepared statement, several times
+        faster than compiling the multi-row INSERTs of `bulk_create`.
+
+        """
+        connection = connections[self.using]
+        fields = [field for field in models.Review._meta.concrete_fields
+                  if not field.primary_key]
+        date_field = models.Review._meta.get_field("submission_date")
+        quote = connection.ops.quote_name
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(models.Review._meta.db_table),
+            ", ".join(quote(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)))
+
+        rows = []
+        for review in reviews:
+            review.submission_date = date_field.get_db_prep_save(
+                review.submission_date, connection)
+            rows.append([getattr(review, field.attname) for field in fields])
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def resolve_companies(self, names):
+        """
+        Adds the ids of the given companies to the in-memory map, creating
+        the missing ones in bulk.
+
+        """
+        names = list(set(names).difference(self.companies))
+        if names:
+            companies = models.Company.objects.using(self.using)
+            companies.bulk_create(models.Company(name=name) for name in names)
+            # No signals on bulk inserts, the cached autocompletions expire.
+            company_cache.invalidate(using=self.using)
+            for chunk in chunks(names):
+                self.companies.update(companies.filter(
+                    name__in=chunk).values_list("name", "id"))
+
+    def resolve_users(self, rows):
+        """ Adds the ids of the batch's reviewers to the in-memory map. """
+        usernames = set(row.get("reviewer") for row in rows
+                        if isinstance(row, dict) and
+                        isinstance(row.get("reviewer"), str))
+        usernames.difference_update(self.users)
+        if usernames:
+            self.users.update(dict.fromkeys(usernames))
+            for chunk in chunks(list(usernames)):
+                self.users.update(User.objects.using(self.using).filter(
+                    username__in=chunk).values_list("username", "id"))
+
+    def build(self, row):
+        """
+        Unsaved review of a row dict (raises ValueError if invalid), with
+        the name of its company in `company_name` (created if missing once
+        the batch is validated).
+
+        """
+        review = models.Review(
+            rating=parse_rating(row["rating"]),
+            title=row["title"],
+            summary=row["summary"],
+            ip_address=row["ip_address"],
+            reviewer_id=self.users.get(str(row["reviewer"])))
+        review.company_name = row["company"]
+
+        self.validate(review, row)
+
+        submission_date = row.get("submission_date")
+        if submission_date:
+            review.submission_date = parse_datetime(submission_date)
+            if review.submission_date is None:
+                raise ValueError("invalid submission_date {!r}".format(
+                    submission_date))
+            if timezone.is_naive(review.submission_date):
+                review.submission_date = timezone.make_aware(
+                    review.submission_date)
+        else:
+            review.submission_date = timezone.now()
+        review.keep_submission_date = True
+        return review
+
+    def validate(self, review, row):
+        """ Raises ValueError when the built review is invalid. """
+        max_length = models.Company._meta.get_field("name").max_length
+        if (not isinstance(review.company_name, str) or
+                not 0 < len(review.company_name) <= max_length):
+            raise ValueError("invalid company {!r}".format(row["company"]))
+        if review.reviewer_id is None:
+            raise ValueError("unknown reviewer {!r}".format(row["reviewer"]))
+        if review.rating not in dict(models.Review.RATINGS):
+            raise ValueError("invalid rating {!r}".format(row["rating"]))
+        for name in ("title", "summary", "ip_address"):
+            value = getattr(review, name)
+            max_length = models.Review._meta.get_field(name).max_length
+            if not isinstance(value, str) or not value:
+                raise ValueError("invalid {}".format(name))
+            if max_length and len(value) > max_length:
+                raise ValueError("{} too long".format(name))
+        try:
+            validate_ipv46_address(review.ip_address)
+        except ValidationError:
+            raise ValueError("invalid ip_address {!r}".format(
+                review.ip_address))
+
+    def report(self, progress, resumed_at, start):
+        elapsed = time.time() - start
+        rate = (progress.rows - resumed_at) / elapsed if elapsed else 0
+        self.stdout.write("{} rows read, {} reviews loaded ({:.0f} rows/s)."
+                          .format(progress.rows, progress.loaded, rate))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consumers import queue
+
+
+class Command(BaseCommand):
+    help = ("Creates the reviews queued by POST /api/reviews/ (when "
+            "REVIEWS_QUEUE_WRITES is on) in batched transactions, polling "
+            "for new ones until interrupted. Run a single worker per "
+            "database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="Seconds to wait for new submissions when the queue is "
+                 "empty.")
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit when the queue is empty.")
+        parser.add_argument(
+            "--database", default="default",
+            help="Database of the queue and the reviews.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("The batch size must be positive.")
+
+        total = 0
+        try:
+            while True:
+                processed = queue.process(options["batch_size"],
+                                          using=options["database"])
+                total += processed
+                if processed:
+                    self.stdout.write("Processed {} submissions.".format(
+                        processed))
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Processed {} submissions in total.".format(total))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from consumers import models
+
+
+class Command(BaseCommand):
+    help = "Recomputes the review statistics of every company from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default="default",
+            help="Database to rebuild the statistics on.")
+
+    def handle(self, *args, **options):
+        total = models.CompanyStats.objects.using(
+            options["database"]).rebuild()
+        self.stdout.write("Rebuilt statistics of {} companies.".format(total))
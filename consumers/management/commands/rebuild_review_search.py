@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from consumers import search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of the reviews from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default="default",
+            help="Database to rebuild the search index on.")
+
+    def handle(self, *args, **options):
+        total = search.rebuild(options["database"])
+        self.stdout.write("Indexed {} reviews.".format(total))
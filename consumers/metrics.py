@@ -0,0 +1,286 @@
+import bisect
+import random
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from django.template.response import SimpleTemplateResponse
+
+
+# Upper bounds of the histogram buckets (seconds and queries).
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Server-Timing descriptions of the request phases.
+PHASES = OrderedDict([
+    ("auth", "Authentication and permissions"),
+    ("sql", "SQL queries"),
+    ("serialize", "View and serialization (without SQL)"),
+    ("render", "Rendering"),
+    ("total", "Total"),
+])
+
+
+class Histogram(object):
+    """ Counts of observed values per bucket, with their sum. """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+    """
+    Thread safe in-process histograms by name and labels, exported in the
+    Prometheus text format (each process exports its own).
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = OrderedDict()
+
+    def register(self, name, help_text, buckets):
+        self.metrics[name] = (help_text, buckets, OrderedDict())
+
+    def observe(self, name, labels, value):
+        _, buckets, histograms = self.metrics[name]
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            histogram = histograms.get(labels)
+            if histogram is None:
+                histogram = histograms[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            for _, _, histograms in self.metrics.values():
+                histograms.clear()
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (help_text, buckets, histograms) in (
+                    self.metrics.items()):
+                lines.append("# HELP {} {}".format(name, help_text))
+                lines.append("# TYPE {} histogram".format(name))
+                for labels, histogram in histograms.items():
+                    lines += self.render_histogram(name, labels, histogram)
+        return "\n".join(lines) + "\n"
+
+    def render_histogram(self, name, labels, histogram):
+        def sample(suffix, value, extra=()):
+            pairs = ",".join('{}="{}"'.format(key, label)
+                             for key, label in labels + tuple(extra))
+            return "{}{}{{{}}} {}".format(name, suffix, pairs, value)
+
+        lines, cumulative = [], 0
+        bounds = [repr(float(bound)) for bound in histogram.buckets]
+        for bound, count in zip(bounds + ["+Inf"], histogram.counts):
+            cumulative += count
+            lines.append(sample("_bucket", cumulative, [("le", bound)]))
+        lines.append(sample("_sum", repr(float(histogram.sum))))
+        lines.append(sample("_count", histogram.count))
+        return lines
+
+
+registry = Registry()
+registry.register("reviews_request_phase_seconds",
+                  "Time spent per request phase.", TIME_BUCKETS)
+registry.register("reviews_request_queries",
+                  "SQL queries per request.", QUERY_BUCKETS)
+
+
+class TimedCursorWrapper(CursorWrapper):
+    """ Cursor adding the time of every query to a `RequestTimer`. """
+
+    def __init__(self, cursor, db, timer):
+        super().__init__(cursor, db)
+        self.timer = timer
+
+    # Override
+    def execute(self, sql, params=None):
+        start = perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self.timer.add_query(perf_counter() - start)
+
+    # Override
+    def executemany(self, sql, param_list):
+        start = perf_counter()
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            self.timer.add_query(perf_counter() - start)
+
+
+class RequestTimer(object):
+    """ Durations (seconds) of the phases of a request and its queries. """
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.phases = OrderedDict()
+        self.queries = 0
+        self.query_time = 0.0
+        self.view = None
+        self.handler_start = None
+        self.handler_query_time = 0.0
+        self.render_start = None
+
+    def add_query(self, duration):
+        self.queries += 1
+        self.query_time += duration
+
+    @contextmanager
+    def track_queries(self):
+        """
+        Times the queries of every database connection of this thread.
+
+        Django 1.10 has no hook around query execution, so the debug cursor
+        of each connection is replaced with a timed one while the request
+        runs (keeping the query log when it was enabled, e.g. in tests).
+
+        """
+        patched = []
+        for connection in connections.all():
+            make_cursor = (connection.make_debug_cursor
+                           if connection.queries_logged
+                           else connection.make_cursor)
+            patched.append((connection, connection.force_debug_cursor))
+            connection.make_debug_cursor = (
+                lambda cursor, connection=connection, make_cursor=make_cursor:
+                TimedCursorWrapper(make_cursor(cursor), connection, self))
+            connection.force_debug_cursor = True
+        try:
+            yield
+        finally:
+            for connection, force_debug_cursor in patched:
+                del connection.make_debug_cursor
+                connection.force_debug_cursor = force_debug_cursor
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = perf_counter() - start
+
+    def handler_started(self):
+        self.handler_start = perf_counter()
+        self.handler_query_time = self.query_time
+
+    def handler_finished(self, view):
+        self.view = view
+        if self.handler_start is not None:
+            self.phases["serialize"] = max(0.0, (
+                perf_counter() - self.handler_start) - (
+                self.query_time - self.handler_query_time))
+
+    def render_started(self):
+        self.render_start = perf_counter()
+
+    def render_finished(self, response):
+        self.phases["render"] = perf_counter() - self.render_start
+
+    def finish(self):
+        self.phases["sql"] = self.query_time
+        self.phases["total"] = perf_counter() - self.start
+
+    def header(self):
+        """ Value of the `Server-Timing` header (durations in ms). """
+        return ", ".join(
+            '{};dur={:.2f};desc="{}"'.format(name, self.phases[name] * 1000,
+                                             description)
+            for name, description in PHASES.items() if name in self.phases)
+
+    def record(self):
+        for name, duration in self.phases.items():
+            registry.observe("reviews_request_phase_seconds",
+                             {"view": self.view, "phase": name}, duration)
+        registry.observe("reviews_request_queries", {"view": self.view},
+                         self.queries)
+
+
+def get_timer(request):
+    """ Timer of a sampled request (Django or DRF), else None. """
+    return getattr(request, "server_timing", None)
+
+
+class ServerTimingMiddleware(object):
+    """
+    Times a sample (`METRICS_SAMPLE_RATE`) of the requests to views using
+    `TimedViewMixin`, adding a `Server-Timing` header to their responses
+    and recording the phases in the histograms of `registry`.
+
+    Must be the first middleware so the total includes the others.
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.METRICS_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        timer = request.server_timing = RequestTimer()
+        with timer.track_queries():
+            response = self.get_response(request)
+        timer.finish()
+
+        if timer.view is not None:
+            response["Server-Timing"] = timer.header()
+            timer.record()
+        return response
+
+
+class TimedViewMixin(object):
+    """
+    DRF view hooks timing the phases of sampled requests (see
+    `ServerTimingMiddleware`).
+
+    """
+
+    def get_metrics_name(self):
+        action = getattr(self, "action", None) or self.request.method.lower()
+        return "{}.{}".format(self.__class__.__name__, action)
+
+    # Override
+    def initial(self, request, *args, **kwargs):
+        timer = get_timer(request)
+        if timer is None:
+            return super().initial(request, *args, **kwargs)
+
+        with timer.phase("auth"):
+            super().initial(request, *args, **kwargs)
+        timer.handler_started()
+
+    # Override
+    def finalize_response(self, request, response, *args, **kwargs):
+        timer = get_timer(request)
+        if timer is not None:
+            timer.handler_finished(self.get_metrics_name())
+
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if (timer is not None and
+                isinstance(response, SimpleTemplateResponse) and
+                not response.is_rendered):
+            timer.render_started()
+            response.add_post_render_callback(timer.render_finished)
+        return response
@@ -12,16 +12,17 @@ def initial_data(apps, schema_editor):
     try:
         Company = apps.get_model("consumers", "Company")
         Review = apps.get_model("consumers", "Review")
+        db_alias = schema_editor.connection.alias
 
-        User.objects.create_superuser(
+        User.objects.db_manager(db_alias).create_superuser(
             'admin',
             email='admin@example.com',
             password='admin')
 
-        company = Company.objects.create(name="Company X")
+        company = Company.objects.using(db_alias).create(name="Company X")
 
         for username in ["user1", "user2"]:
-            user = User.objects.create_user(
+            user = User.objects.db_manager(db_alias).create_user(
                 username,
                 email="{}@example.com".format(username),
                 password=username)
@@ -33,7 +34,7 @@ def initial_data(apps, schema_editor):
             review.ip_address = "123.123.123.123"
             review.company = company
             review.reviewer_id = user.id
-            review.save()
+            review.save(using=db_alias)
 
     except Exception as e:
         print(e)
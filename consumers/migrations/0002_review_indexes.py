@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2026-10-18 16:01
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('consumers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='company',
+            options={'ordering': ['name'], 'verbose_name_plural': 'Companies'},
+        ),
+        migrations.AlterIndexTogether(
+            name='review',
+            index_together=set([('reviewer', 'company', 'submission_date'), ('reviewer', 'rating', 'submission_date'), ('reviewer', 'submission_date')]),
+        ),
+    ]
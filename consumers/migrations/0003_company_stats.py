@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2026-10-18 16:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def initial_stats(apps, schema_editor):
+    CompanyStats = apps.get_model("consumers", "CompanyStats")
+    Review = apps.get_model("consumers", "Review")
+    db_alias = schema_editor.connection.alias
+
+    stats = {}
+    rows = Review.objects.using(db_alias).order_by().values(
+        "company_id", "rating").annotate(count=models.Count("id"))
+    for row in rows:
+        company_stats = stats.setdefault(
+            row["company_id"], CompanyStats(company_id=row["company_id"]))
+        rating, count = int(row["rating"]), row["count"]
+        field_name = "rating_{}".format(rating)
+        setattr(company_stats, field_name,
+                getattr(company_stats, field_name) + count)
+        company_stats.review_count += count
+        company_stats.rating_total += rating * count
+
+    for company_stats in stats.values():
+        company_stats.rating_average = (company_stats.rating_total /
+                                        company_stats.review_count)
+    CompanyStats.objects.using(db_alias).bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0002_review_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyStats',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='consumers.Company')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('rating_average', models.FloatField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Company stats',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='companystats',
+            index_together=set([('rating_average', 'review_count')]),
+        ),
+        migrations.RunPython(initial_stats, migrations.RunPython.noop),
+    ]
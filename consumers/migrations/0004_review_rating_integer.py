@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2026-10-18 16:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 5000
+
+
+def copy_ratings(apps, schema_editor, source, target, convert):
+    """
+    Copy `source` into `target` by id ranges of `BATCH_SIZE` reviews, with
+    one UPDATE per distinct value in the range.
+
+    The batches only bound the size of each statement: the whole migration,
+    including the table remakes SQLite needs for every column change, runs
+    in a single transaction, so the database stays write locked and the
+    journal grows with the table until it commits. Plan a maintenance
+    window for large tables.
+
+    """
+    Review = apps.get_model("consumers", "Review")
+    reviews = Review.objects.using(schema_editor.connection.alias)
+
+    last_id = reviews.aggregate(last_id=models.Max("id"))["last_id"] or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        batch = reviews.filter(id__gte=start, id__lt=start + BATCH_SIZE)
+        values = batch.order_by().values_list(source, flat=True).distinct()
+        for value in list(values):
+            batch.filter(**{source: value}).update(**{target: convert(value)})
+
+
+def ratings_to_integers(apps, schema_editor):
+    copy_ratings(apps, schema_editor, "rating", "rating_value",
+                 lambda value: int(str(value).strip()))
+
+
+def ratings_to_strings(apps, schema_editor):
+    copy_ratings(apps, schema_editor, "rating_value", "rating", str)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0003_company_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='rating_value',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.CharField(choices=[('1', '1'), ('2', '2'), ('3', '3'), ('4', '4'), ('5', '5')], max_length=2, null=True),
+        ),
+        migrations.RunPython(ratings_to_integers, ratings_to_strings),
+        migrations.AlterIndexTogether(
+            name='review',
+            index_together=set([('reviewer', 'company', 'submission_date'), ('reviewer', 'submission_date')]),
+        ),
+        migrations.RemoveField(
+            model_name='review',
+            name='rating',
+        ),
+        migrations.RenameField(
+            model_name='review',
+            old_name='rating_value',
+            new_name='rating',
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveSmallIntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='review',
+            index_together=set([('reviewer', 'company', 'submission_date'), ('reviewer', 'rating', 'submission_date'), ('reviewer', 'submission_date')]),
+        ),
+    ]
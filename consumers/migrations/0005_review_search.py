@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE consumers_review_search "
+        "USING fts5(title, summary)")
+    schema_editor.execute(
+        "INSERT INTO consumers_review_search (rowid, title, summary) "
+        "SELECT id, title, summary FROM consumers_review")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE consumers_review_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0004_review_rating_integer'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
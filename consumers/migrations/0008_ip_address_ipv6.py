@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2026-10-18 16:43
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0007_review_submission'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='ip_address',
+            field=models.GenericIPAddressField(),
+        ),
+        migrations.AlterField(
+            model_name='reviewsubmission',
+            name='ip_address',
+            field=models.GenericIPAddressField(),
+        ),
+    ]
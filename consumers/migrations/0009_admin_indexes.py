@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2026-10-18 16:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0008_ip_address_ipv6'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='submission_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def create_name_index(apps, schema_editor):
+    # Serves case insensitive prefix searches (LIKE 'prefix%') of names.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE INDEX consumers_company_name_nocase "
+        "ON consumers_company (name COLLATE NOCASE)")
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP INDEX consumers_company_name_nocase")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consumers', '0009_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
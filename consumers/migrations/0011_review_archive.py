@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2026-10-18 17:02
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+COLUMNS = ("id, rating, title, summary, ip_address, submission_date, "
+           "company_id, reviewer_id")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('consumers', '0010_company_name_nocase_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewWithArchived',
+            fields=[
+                ('rating', models.PositiveSmallIntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')])),
+                ('title', models.CharField(max_length=64)),
+                ('summary', models.CharField(max_length=10000)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('submission_date', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'consumers_review_with_archived',
+                'ordering': ['-submission_date'],
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReview',
+            fields=[
+                ('rating', models.PositiveSmallIntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')])),
+                ('title', models.CharField(max_length=64)),
+                ('summary', models.CharField(max_length=10000)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('submission_date', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='consumers.Company')),
+                ('reviewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-submission_date'],
+                'abstract': False,
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='archivedreview',
+            index_together=set([('reviewer', 'rating', 'submission_date'), ('reviewer', 'company', 'submission_date'), ('reviewer', 'submission_date')]),
+        ),
+        # Split statements, so sqlparse isn't needed.
+        migrations.RunSQL(
+            ["CREATE VIEW consumers_review_with_archived AS "
+             "SELECT {0} FROM consumers_review UNION ALL "
+             "SELECT {0} FROM consumers_archivedreview".format(COLUMNS)],
+            ["DROP VIEW consumers_review_with_archived"]),
+    ]
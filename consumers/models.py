@@ -1,9 +1,15 @@
+import uuid
+from collections import defaultdict
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Case, ExpressionWrapper, F, Value, When
+
+from consumers.signals import reviews_created
 
 
 class Company(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
 
     def __str__(self):
         return self.name
@@ -13,19 +19,78 @@ class Company(models.Model):
         verbose_name_plural = "Companies"
 
 
-class Review(models.Model):
-    RATINGS = (("1", "1"),
-               ("2", "2"),
-               ("3", "3"),
-               ("4", "4"),
-               ("5", "5"),
+class ReviewQuerySet(models.QuerySet):
+
+    # Override
+    def bulk_create(self, objs, batch_size=None):
+        """
+        Overriding to set the ids of the inserted reviews on backends that
+        don't return them (SQLite).
+
+        The ids are read back in the same transaction as the insert, which
+        holds the database write lock, so the newest ids are the inserted ones.
+
+        """
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, batch_size=batch_size)
+            missing = [obj for obj in objs if obj.pk is None]
+            if missing:
+                ids = self.model._base_manager.using(self.db).order_by(
+                    "-pk").values_list("pk", flat=True)[:len(missing)]
+                for obj, pk in zip(missing, reversed(list(ids))):
+                    obj.pk = pk
+                    obj._state.adding = False
+                    obj._state.db = self.db
+            if objs:
+                reviews_created.send(sender=self.model, reviews=objs,
+                                     using=self.db)
+        return objs
+
+
+class SubmissionDateField(models.DateTimeField):
+    """
+    Date set to now on insert (`auto_now_add`), unless the instance has
+    `keep_submission_date` set to keep the date it carries (for reviews
+    queued or loaded from files).
+
+    """
+
+    # Override
+    def pre_save(self, model_instance, add):
+        if add and getattr(model_instance, "keep_submission_date", False):
+            return getattr(model_instance, self.attname)
+        return super().pre_save(model_instance, add)
+
+    # Override
+    def deconstruct(self):
+        """
+        Overriding to migrate as a plain DateTimeField (same column).
+
+        """
+        name, _, args, kwargs = super().deconstruct()
+        return name, "django.db.models.DateTimeField", args, kwargs
+
+
+class AbstractReview(models.Model):
+    """
+    Columns of the reviews, shared by the live (hot) table, the archive of
+    the old ones and the view spanning both.
+
+    """
+    RATINGS = ((1, "1"),
+               (2, "2"),
+               (3, "3"),
+               (4, "4"),
+               (5, "5"),
                )
 
-    rating = models.CharField(max_length=2, choices=RATINGS)
+    rating = models.PositiveSmallIntegerField(choices=RATINGS)
     title = models.CharField(max_length=64)
     summary = models.CharField(max_length=10000)
-    ip_address = models.CharField(max_length=20)
-    submission_date = models.DateTimeField(auto_now_add=True)
+    ip_address = models.GenericIPAddressField()
+    # Indexed for the admin, which lists every reviewer's reviews by date.
+    submission_date = SubmissionDateField(auto_now_add=True, db_index=True)
     company = models.ForeignKey(Company)
     reviewer = models.ForeignKey(User)
 
@@ -33,4 +98,234 @@ class Review(models.Model):
         return self.title
 
     class Meta:
+        abstract = True
         ordering = ["-submission_date"]
+        # Listings are always scoped by reviewer and sorted by date.
+        index_together = [
+            ["reviewer", "submission_date"],
+            ["reviewer", "company", "submission_date"],
+            ["reviewer", "rating", "submission_date"],
+        ]
+
+
+class Review(AbstractReview):
+
+    objects = ReviewQuerySet.as_manager()
+
+    # Override
+    def save(self, *args, **kwargs):
+        """
+        Overriding to notify the creation within the insert transaction.
+
+        """
+        using = (kwargs.get("using") or
+                 router.db_for_write(self.__class__, instance=self))
+        created = self._state.adding
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if created:
+                reviews_created.send(sender=self.__class__, reviews=[self],
+                                     using=self._state.db)
+
+    class Meta(AbstractReview.Meta):
+        pass
+
+
+class ArchivedReviewQuerySet(models.QuerySet):
+
+    def overlaps(self, start=None, end=None):
+        """
+        Whether any review was submitted between `start` and `end`
+        (inclusive, unbounded when None).
+
+        """
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(submission_date__gte=start)
+        if end is not None:
+            queryset = queryset.filter(submission_date__lte=end)
+        return queryset.exists()
+
+
+class ArchivedReview(AbstractReview):
+    """
+    Review moved out of the live table by `archive_reviews`, keeping its id
+    (and its place in the company stats and the search index).
+
+    """
+    id = models.IntegerField(primary_key=True)
+
+    objects = ArchivedReviewQuerySet.as_manager()
+
+    class Meta(AbstractReview.Meta):
+        pass
+
+
+class ReviewWithArchived(AbstractReview):
+    """
+    Read only view of the live and the archived reviews (UNION ALL, see
+    migration 0011, to recreate along with any change of the columns).
+
+    """
+    id = models.IntegerField(primary_key=True)
+    # The tables' own relations cascade, a view can't be deleted from.
+    company = models.ForeignKey(Company, on_delete=models.DO_NOTHING,
+                                related_name="+")
+    reviewer = models.ForeignKey(User, on_delete=models.DO_NOTHING,
+                                 related_name="+")
+
+    class Meta(AbstractReview.Meta):
+        managed = False
+        db_table = "consumers_review_with_archived"
+        index_together = []
+
+
+class CompanyStatsQuerySet(models.QuerySet):
+
+    def rebuild(self):
+        """
+        Replaces the stats of every company with the ones aggregated from
+        its reviews (archived ones included) in a single GROUP BY query.
+        Returns the amount of companies with stats.
+
+        """
+        histogram = dict(
+            ("rating_{}".format(rating), models.Sum(Case(
+                When(rating=rating, then=Value(1)),
+                default=Value(0),
+                output_field=models.IntegerField())))
+            for rating, _ in Review.RATINGS)
+        rows = ReviewWithArchived.objects.using(self.db).order_by().values(
+            "company_id").annotate(review_count=models.Count("id"),
+                                   rating_total=models.Sum("rating"),
+                                   rating_average=models.Avg("rating"),
+                                   **histogram)
+        stats = [self.model(**row) for row in rows.iterator()]
+
+        with transaction.atomic(using=self.db):
+            self.model._base_manager.using(self.db).all().delete()
+            self.bulk_create(stats)
+        return len(stats)
+
+    def apply(self, reviews, sign=1):
+        """
+        Adds (or subtracts with a negative `sign`) the given reviews to the
+        stats of their companies with one UPDATE per company.
+
+        """
+        deltas = defaultdict(lambda: defaultdict(int))
+        for review in reviews:
+            rating = int(review.rating)
+            delta = deltas[review.company_id]
+            delta["review_count"] += sign
+            delta["rating_total"] += sign * rating
+            delta["rating_{}".format(rating)] += sign
+
+        for company_id, delta in deltas.items():
+            if self._apply_delta(company_id, delta) or sign < 0:
+                continue
+            average = delta["rating_total"] / delta["review_count"]
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(company_id=company_id, rating_average=average,
+                                **delta)
+            except IntegrityError:
+                # Created concurrently since the update was attempted.
+                self._apply_delta(company_id, delta)
+
+    def _apply_delta(self, company_id, delta):
+        count = delta["review_count"]
+        values = dict((name, F(name) + value)
+                      for name, value in delta.items())
+        values["rating_average"] = Case(
+            When(review_count=-count, then=Value(0.0)),
+            default=ExpressionWrapper(
+                (F("rating_total") + delta["rating_total"]) * 1.0 /
+                (F("review_count") + count),
+                output_field=models.FloatField()),
+            output_field=models.FloatField())
+        return self.filter(company_id=company_id).update(**values)
+
+
+class CompanyStats(models.Model):
+    """
+    Review statistics of a company, maintained on every review insert, edit
+    and deletion (see `consumers.receivers`) so they are never aggregated on
+    reads.
+
+    """
+    company = models.OneToOneField(Company, primary_key=True,
+                                   related_name="stats")
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    objects = CompanyStatsQuerySet.as_manager()
+
+    def __str__(self):
+        return "{} ({})".format(self.company_id, self.rating_average)
+
+    @property
+    def histogram(self):
+        return dict((label, getattr(self, "rating_{}".format(rating)))
+                    for rating, label in Review.RATINGS)
+
+    class Meta:
+        verbose_name_plural = "Company stats"
+        # Leaderboard ordering.
+        index_together = [["rating_average", "review_count"]]
+
+
+class ReviewLoad(models.Model):
+    """
+    Progress of a `load_reviews` run over a source file, saved in the
+    transaction of every batch so a crashed load resumes right after the
+    last inserted row.
+
+    """
+    source = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveIntegerField(default=0)
+    loaded = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "{} ({} rows)".format(self.source, self.rows)
+
+
+class ReviewSubmission(models.Model):
+    """
+    Review accepted by the API and queued (see `REVIEWS_QUEUE_WRITES`) until
+    `process_review_queue` creates it. The ticket identifies it to clients.
+
+    """
+    PENDING = "pending"
+    CREATED = "created"
+    FAILED = "failed"
+    STATUSES = ((PENDING, "Pending"),
+                (CREATED, "Created"),
+                (FAILED, "Failed"),
+                )
+
+    ticket = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING)
+    data = models.TextField()  # Validated payload, as JSON.
+    errors = models.TextField(blank=True)  # As JSON, when it failed.
+    ip_address = models.GenericIPAddressField()
+    reviewer = models.ForeignKey(User)
+    review = models.ForeignKey(Review, null=True, blank=True,
+                               on_delete=models.SET_NULL)
+    submitted = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return "{} ({})".format(self.ticket, self.status)
+
+    class Meta:
+        # The worker takes the oldest pending submissions.
+        index_together = [["status", "id"]]
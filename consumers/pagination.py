@@ -0,0 +1,218 @@
+from base64 import b64decode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils import six
+from django.utils.six.moves.urllib import parse as urlparse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination, Cursor, _positive_int, _reverse_ordering)
+
+
+def keyset_filter(ordering, position):
+    """
+    Filter selecting the rows placed after ``position`` for ``ordering``.
+
+    The row comparison is expanded into ``OR`` clauses and prefixed with an
+    inclusive bound on the leading column, so the database can seek straight
+    into an index on it instead of walking every preceding row.
+
+    """
+    condition = Q()
+    for index, order in enumerate(ordering):
+        lookup = "__lt" if order.startswith("-") else "__gt"
+        kwargs = dict((previous.lstrip("-"), value)
+                      for previous, value in zip(ordering[:index], position))
+        kwargs[order.lstrip("-") + lookup] = position[index]
+        condition |= Q(**kwargs)
+
+    first = ordering[0]
+    lookup = "__lte" if first.startswith("-") else "__gte"
+    return Q(**{first.lstrip("-") + lookup: position[0]}) & condition
+
+
+def keyset_ordering(queryset, tiebreaker="id", default=("-id",)):
+    """
+    Ordering applied to the queryset (by filters or the model default)
+    completed with a unique ``tiebreaker`` in the direction of the first
+    column, so it can be used to seek.
+
+    """
+    query = queryset.query
+    ordering = list(query.order_by)
+    if not ordering and query.default_ordering:
+        ordering = list(queryset.model._meta.ordering)
+    if not ordering:
+        ordering = list(default)
+
+    ordering = [order.replace("pk", tiebreaker, 1)
+                if order.lstrip("-") == "pk" else order
+                for order in ordering]
+    if tiebreaker not in [order.lstrip("-") for order in ordering]:
+        prefix = "-" if ordering[0].startswith("-") else ""
+        ordering.append(prefix + tiebreaker)
+
+    return tuple(ordering)
+
+
+def with_ordering_columns(queryset, ordering):
+    """
+    Adds the ``ordering`` columns missing from a ``values()`` queryset (of a
+    sparse fieldset), as the positions to seek from are read from its rows.
+
+    """
+    fields = getattr(queryset, "_fields", None)
+    if not fields:
+        return queryset
+    missing = [order.lstrip("-") for order in ordering
+               if order.lstrip("-") not in fields]
+    if not missing:
+        return queryset
+    return queryset.values(*(tuple(fields) + tuple(missing)))
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination seeking on the full ordering of the queryset.
+
+    The ordering is taken from the queryset (filters or model default) and
+    completed with ``id`` as a unique tie-breaker. The cursor stores the
+    value of every ordering column for the boundary row, so each page is a
+    single ``WHERE ... LIMIT`` query whose cost does not depend on how deep
+    the client is, and rows inserted while paging never shift the pages.
+
+    """
+    ordering = ("-id",)
+    tiebreaker = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    # Override
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = None
+        if self.cursor is not None and self.cursor.position is not None:
+            position = self._parse_position(queryset, self.cursor.position)
+
+        ordering = (_reverse_ordering(self.ordering) if reverse
+                    else self.ordering)
+        queryset = with_ordering_columns(queryset.order_by(*ordering),
+                                         ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, position))
+
+        # Fetch an extra row to know if there is a page after this one.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+        has_preceding = position is not None and bool(self.page)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = has_preceding, has_following
+        else:
+            self.has_next, self.has_previous = has_following, has_preceding
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    # Override
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    # Override
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        position = self._get_position_from_instance(
+            self.page[-1], self.ordering)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position))
+
+    # Override
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        position = self._get_position_from_instance(
+            self.page[0], self.ordering)
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position))
+
+    # Override
+    def get_ordering(self, request, queryset, view):
+        """
+        Overriding to use the ordering already applied to the queryset.
+
+        """
+        return keyset_ordering(queryset, self.tiebreaker, self.ordering)
+
+    # Override
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = urlparse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+            position = tokens.get("p")
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if position is not None and len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    # Override
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            if isinstance(instance, dict):
+                value = instance[field_name]
+            else:
+                value = getattr(instance, field_name)
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            position.append(six.text_type(value))
+        return position
+
+    def _parse_position(self, queryset, position):
+        """
+        Convert the raw cursor values to python values of their columns.
+
+        """
+        values = []
+        for order, raw in zip(self.ordering, position):
+            name = order.lstrip("-")
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = queryset.query.annotations[name].output_field
+            try:
+                values.append(field.to_python(raw))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
@@ -0,0 +1,22 @@
+import rapidjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from consumers.renderers import RapidJSONRenderer
+
+
+class RapidJSONParser(JSONParser):
+    """ JSON parser decoding with RapidJSON instead of the `json` module. """
+
+    renderer_class = RapidJSONRenderer
+
+    # Override
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+
+        try:
+            return rapidjson.loads(stream.read().decode(encoding))
+        except ValueError as exc:
+            raise ParseError("JSON parse error - {}".format(exc))
@@ -0,0 +1,68 @@
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from consumers import models, serializers
+
+
+def enqueue(serializer, reviewer, ip_address):
+    """
+    Saves the validated data of a `ReviewSerializer` as a pending
+    submission, committed before returning so it's never lost.
+
+    """
+    data = dict((name, getattr(value, "pk", value))
+                for name, value in serializer.validated_data.items())
+    return models.ReviewSubmission.objects.create(
+        data=json.dumps(data), reviewer=reviewer, ip_address=ip_address)
+
+
+def process(batch_size, using="default"):
+    """
+    Creates the reviews of the oldest pending submissions (validating them
+    again, their company may be gone) and marks them as created or failed,
+    all in one transaction: if the worker dies the batch stays pending and
+    is processed again. Returns the amount of submissions processed.
+
+    A single worker per database is expected (SQLite has one writer).
+
+    """
+    with transaction.atomic(using=using):
+        submissions = list(models.ReviewSubmission.objects.using(
+            using).filter(status=models.ReviewSubmission.PENDING).order_by(
+                "id")[:batch_size])
+        if not submissions:
+            return 0
+
+        payloads = [json.loads(submission.data)
+                    for submission in submissions]
+        context = {"companies": models.Company.objects.using(using).in_bulk(
+            list(set(payload.get("company") for payload in payloads)))}
+        created, reviews = [], []
+        for submission, payload in zip(submissions, payloads):
+            serializer = serializers.ReviewSerializer(data=payload,
+                                                      context=context)
+            if serializer.is_valid():
+                submission.status = models.ReviewSubmission.CREATED
+                created.append(submission)
+                review = models.Review(reviewer_id=submission.reviewer_id,
+                                       ip_address=submission.ip_address,
+                                       submission_date=submission.submitted,
+                                       **serializer.validated_data)
+                review.keep_submission_date = True
+                reviews.append(review)
+            else:
+                submission.status = models.ReviewSubmission.FAILED
+                submission.errors = json.dumps(serializer.errors)
+
+        reviews = models.Review.objects.using(using).bulk_create(reviews)
+        for submission, review in zip(created, reviews):
+            submission.review = review
+
+        processed = timezone.now()
+        for submission in submissions:
+            submission.processed = processed
+            submission.save(using=using, update_fields=[
+                "status", "errors", "review", "processed"])
+    return len(submissions)
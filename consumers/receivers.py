@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from consumers import cache, models, search
+from consumers.authentication import token_cache
+from consumers.companies import company_cache
+from consumers.signals import reviews_created
+
+
+@receiver(reviews_created, sender=models.Review)
+def add_company_stats(sender, reviews, using, **kwargs):
+    """ Count the new reviews in the stats of their companies. """
+    models.CompanyStats.objects.using(using).apply(reviews)
+
+
+@receiver(pre_save, sender=models.Review)
+def read_previous_stats(sender, instance, raw, using, update_fields,
+                        **kwargs):
+    """
+    Keep the stored rating and company of an edited review, to move it in
+    the stats when they change.
+
+    """
+    instance._previous_stats = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if (update_fields is not None and
+            not {"rating", "company", "company_id"} & set(update_fields)):
+        return
+    instance._previous_stats = models.Review._base_manager.using(
+        using).filter(pk=instance.pk).values("rating", "company_id").first()
+
+
+@receiver(post_save, sender=models.Review)
+def update_company_stats(sender, instance, created, using, **kwargs):
+    """ Move an edited review to its new rating and/or company. """
+    previous = getattr(instance, "_previous_stats", None)
+    instance._previous_stats = None
+    if created or previous is None:
+        return
+    if (previous["rating"] == int(instance.rating) and
+            previous["company_id"] == instance.company_id):
+        return
+    stats = models.CompanyStats.objects.using(using)
+    stats.apply([models.Review(**previous)], sign=-1)
+    stats.apply([instance])
+
+
+@receiver(post_delete, sender=models.Review)
+@receiver(post_delete, sender=models.ArchivedReview)
+def remove_company_stats(sender, instance, using, **kwargs):
+    """ Discount a deleted review from the stats of its company. """
+    models.CompanyStats.objects.using(using).apply([instance], sign=-1)
+
+
+@receiver(reviews_created, sender=models.Review)
+def invalidate_created_responses(sender, reviews, using, **kwargs):
+    """ Expire the cached responses of the reviewers. """
+    cache.invalidate([review.reviewer_id for review in reviews], using=using)
+
+
+@receiver(post_delete, sender=models.Review)
+@receiver(post_delete, sender=models.ArchivedReview)
+def invalidate_deleted_responses(sender, instance, using, **kwargs):
+    """ Expire the cached responses of the reviewer. """
+    cache.invalidate([instance.reviewer_id], using=using)
+
+
+@receiver(reviews_created, sender=models.Review)
+def mark_created_writers(sender, reviews, **kwargs):
+    """ Keep the reviewers reading from the primary for a while. """
+    cache.mark_written([review.reviewer_id for review in reviews])
+
+
+@receiver(post_delete, sender=models.Review)
+@receiver(post_delete, sender=models.ArchivedReview)
+def mark_deleted_writer(sender, instance, **kwargs):
+    """ Keep the reviewer reading from the primary for a while. """
+    cache.mark_written([instance.reviewer_id])
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, using, **kwargs):
+    """
+    Forget the verified tokens of a user that changed in every process (it
+    may have been deactivated or changed its password).
+
+    """
+    token_cache.invalidate_user(instance.pk, using=using)
+
+
+@receiver(post_save, sender=models.Company)
+@receiver(post_delete, sender=models.Company)
+def invalidate_companies(sender, using, **kwargs):
+    """ Expire the cached companies of every process. """
+    company_cache.invalidate(using=using)
+
+
+@receiver(reviews_created, sender=models.Review)
+def index_created_reviews(sender, reviews, using, **kwargs):
+    """ Add the new reviews to the full-text index. """
+    search.index(reviews, using=using)
+
+
+@receiver(post_save, sender=models.Review)
+def index_updated_review(sender, instance, created, using, **kwargs):
+    """ Index the new title/summary of an edited review. """
+    if not created:
+        search.index([instance], using=using)
+
+
+@receiver(post_delete, sender=models.Review)
+@receiver(post_delete, sender=models.ArchivedReview)
+def unindex_deleted_review(sender, instance, using, **kwargs):
+    """ Remove a deleted review from the full-text index. """
+    search.unindex([instance.pk], using=using)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Run the SQLITE_PRAGMAS, in order, on new SQLite connections (on the
+    driver's connection, so they don't show in the query log).
+
+    """
+    if connection.vendor != "sqlite":
+        return
+    for name, value in settings.SQLITE_PRAGMAS:
+        connection.connection.execute("PRAGMA {} = {}".format(name, value))
@@ -0,0 +1,45 @@
+import msgpack
+import rapidjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Representation of the values the encoders don't support natively (lazy
+# strings, querysets...), the same as DRF's JSON encoder.
+encode_default = JSONEncoder().default
+
+
+class RapidJSONRenderer(JSONRenderer):
+    """
+    JSON renderer encoding with RapidJSON (in C++) instead of the `json`
+    module, with the same output: compact unless an indent is requested
+    (e.g. by the browsable API), and \\u2028 and \\u2029 escaped.
+
+    """
+
+    # Override
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        ret = rapidjson.dumps(data, ensure_ascii=self.ensure_ascii,
+                              indent=indent, default=encode_default)
+        if not self.ensure_ascii:
+            ret = ret.replace("\u2028", "\\u2028").replace("\u2029",
+                                                           "\\u2029")
+        return ret.encode("utf-8")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """ Renderer serializing to MessagePack (smaller and faster than JSON). """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+        return msgpack.packb(data, use_bin_type=True, default=encode_default)
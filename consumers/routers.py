@@ -0,0 +1,63 @@
+import random
+import threading
+
+from django.conf import settings
+
+from consumers import cache
+
+
+_state = threading.local()
+
+
+def get_read_alias():
+    """ Replica the current thread reads from (None for the primary). """
+    return getattr(_state, "alias", None)
+
+
+def set_read_alias(alias):
+    _state.alias = alias
+
+
+class ReplicaRouter(object):
+    """
+    Sends the reads of requests served from a replica (see
+    `ReplicaReadMixin`) to it, and everything else to the primary.
+
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        return None  # The primary (default).
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+class ReplicaReadMixin(object):
+    """
+    Serves `replica_actions` from one of `REVIEWS_READ_DATABASES`, except
+    for users who wrote in the last `REVIEWS_READ_YOUR_WRITES_WINDOW`
+    seconds, who keep reading from the primary so they see their writes.
+
+    Authentication and permissions are checked on the primary.
+
+    """
+    replica_actions = ("list", "retrieve")
+
+    # Override
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        aliases = settings.REVIEWS_READ_DATABASES
+        if (aliases and self.action in self.replica_actions and
+                not cache.recently_written(request.user.pk)):
+            set_read_alias(random.choice(aliases))
+
+    # Override
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            set_read_alias(None)
@@ -0,0 +1,92 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from consumers import models
+
+
+TABLE = "consumers_review_search"
+
+
+def is_supported(using="default"):
+    """ Whether the database has the full-text index (SQLite only). """
+    return connections[using].vendor == "sqlite"
+
+
+def index(reviews, using="default"):
+    """ Adds (or replaces) the given reviews in the full-text index. """
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO {} (rowid, title, summary) "
+            "VALUES (%s, %s, %s)".format(TABLE),
+            [(review.pk, review.title, review.summary) for review in reviews])
+
+
+def unindex(review_ids, using="default"):
+    """ Removes the given reviews from the full-text index. """
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany("DELETE FROM {} WHERE rowid = %s".format(TABLE),
+                           [(review_id,) for review_id in review_ids])
+
+
+def rebuild(using="default"):
+    """
+    Replaces the full-text index with the current reviews, archived ones
+    included. Returns the amount of reviews indexed.
+
+    """
+    if not is_supported(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute("DELETE FROM {}".format(TABLE))
+        cursor.execute(
+            "INSERT INTO {} (rowid, title, summary) "
+            "SELECT id, title, summary FROM {}".format(
+                TABLE, models.ReviewWithArchived._meta.db_table))
+        cursor.execute("INSERT INTO {0} ({0}) VALUES ('optimize')".format(
+            TABLE))
+        cursor.execute("SELECT COUNT(*) FROM {}".format(TABLE))
+        return cursor.fetchone()[0]
+
+
+def match_expression(text):
+    """
+    FTS5 query matching every word of `text` (quoted, so user input is
+    never parsed as query syntax). Empty when `text` has no words.
+
+    """
+    return " ".join('"{}"'.format(word) for word in re.findall(r"\w+", text))
+
+
+def search(queryset, text):
+    """
+    Filters the reviews matching `text`, annotated with their `rank` (BM25,
+    lower is more relevant). The annotation is a plain column of the query,
+    so the listing pagination can seek on it.
+
+    """
+    expression = match_expression(text)
+    if not expression or not is_supported(queryset.db):
+        unranked = queryset.annotate(
+            rank=RawSQL("0.0", (), output_field=FloatField()))
+        if not expression:
+            return unranked.none()
+        return unranked.filter(
+            Q(title__icontains=text) | Q(summary__icontains=text))
+
+    # The full-text table is joined once, so the match and the rank come
+    # from a single scan of the index.
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[TABLE],
+        where=["{0}.rowid = {1}.id".format(TABLE, table),
+               "{0} MATCH %s".format(TABLE)],
+        params=[expression]).annotate(
+            rank=RawSQL("bm25({})".format(TABLE), (),
+                        output_field=FloatField()))
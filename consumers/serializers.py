@@ -1,6 +1,13 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
 
 from consumers import models
+from consumers.companies import company_cache
 
 
 class ReviewerSerializer(serializers.Serializer):
@@ -31,10 +38,299 @@ class ReviewNestedSerializer(serializers.ModelSerializer):
         model = models.Review
         fields = "__all__"
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Load the company and the rendered reviewer columns in the same query.
+
+        """
+        fields = [field.name for field in models.Review._meta.concrete_fields]
+        fields += ["company__{}".format(name)
+                   for name in CompanySerializer().fields]
+        fields += ["reviewer__{}".format(name)
+                   for name in ReviewerSerializer._declared_fields]
+        return queryset.select_related("company", "reviewer").only(*fields)
+
+
+class CompanyField(serializers.PrimaryKeyRelatedField):
+    """
+    Company relation, resolved from the `companies` mapping of the context
+    when the caller already loaded them (bulk creation), or from the company
+    cache otherwise.
+
+    """
+
+    # Override
+    def to_internal_value(self, data):
+        try:
+            company_id = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        companies = self.context.get("companies")
+        if companies is None:
+            company = company_cache.get(company_id)
+        else:
+            company = companies.get(company_id)
+        if company is None:
+            self.fail("does_not_exist", pk_value=data)
+        return company
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     """ Review model serializer. """
 
+    company = CompanyField(queryset=models.Company.objects.all())
+
     class Meta:
         model = models.Review
         fields = "__all__"
+        read_only_fields = ("reviewer", "ip_address")
+
+
+class ReviewSubmissionSerializer(serializers.ModelSerializer):
+    """ Queued review submission serializer. """
+
+    url = serializers.HyperlinkedIdentityField(
+        view_name="reviewsubmission-detail", lookup_field="ticket")
+    # Not `errors`, which is taken by the serializer itself.
+    validation_errors = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.ReviewSubmission
+        fields = ("ticket", "url", "status", "review", "validation_errors",
+                  "submitted", "processed")
+
+    def get_validation_errors(self, submission):
+        return json.loads(submission.errors) if submission.errors else None
+
+
+def parse_fields(value):
+    """
+    Tree of the comma separated field names of `value`, where dotted names
+    select fields of nested serializers: "id,company.name" gives
+    {"id": {}, "company": {"name": {}}}.
+
+    """
+    tree = OrderedDict()
+    for name in value.split(","):
+        node = tree
+        for part in name.split("."):
+            if part.strip():
+                node = node.setdefault(part.strip(), OrderedDict())
+    return tree
+
+
+class ValuesSerializer(object):
+    """
+    Read only serializer producing the output of `serializer_class` straight
+    from `values()` rows, without model instances nor DRF field objects.
+
+    The mapping from each output field to its column (and, when the stored
+    value isn't already its representation, to the DRF conversion) is
+    computed once per class. The `fields` tree (see `parse_fields`) narrows
+    it to a sparse fieldset, both in the output and the selected columns.
+
+    """
+    serializer_class = None
+    # Fields whose database value is already their representation.
+    identity_fields = (serializers.CharField,
+                       serializers.IntegerField,
+                       serializers.ChoiceField,
+                       serializers.PrimaryKeyRelatedField)
+
+    def __init__(self, instance=None, many=False, context=None, fields=None,
+                 **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.plan = self.select_plan(fields)
+
+    @classmethod
+    def get_plan(cls):
+        """ List of (name, column, conversion or nested plan) per field. """
+        if "_plan" not in cls.__dict__:
+            cls._plan = cls._build_plan(cls.serializer_class(), "")
+        return cls._plan
+
+    @classmethod
+    def _build_plan(cls, serializer, prefix):
+        plan = []
+        for name, field in serializer.fields.items():
+            column = prefix + field.source.replace(".", "__")
+            if isinstance(field, serializers.BaseSerializer):
+                plan.append(
+                    (name, None, cls._build_plan(field, column + "__")))
+            elif isinstance(field, cls.identity_fields):
+                plan.append((name, column, None))
+            else:
+                plan.append((name, column, field.to_representation))
+        return plan
+
+    @classmethod
+    def select_plan(cls, fields=None, plan=None, prefix=""):
+        """
+        The plan restricted to the `fields` tree (the whole plan when None).
+        Raises a ValidationError on unknown fields.
+
+        """
+        plan = plan or cls.get_plan()
+        if not fields:
+            return plan
+
+        names = [name for name, _, _ in plan]
+        unknown = [prefix + name for name in fields if name not in names]
+        selected = []
+        for name, column, conversion in plan:
+            if name not in fields:
+                continue
+            children = fields[name]
+            if column is None:
+                conversion = cls.select_plan(children, conversion,
+                                             prefix + name + ".")
+            elif children:
+                unknown += [prefix + name + "." + child
+                            for child in children]
+            selected.append((name, column, conversion))
+        if unknown:
+            raise serializers.ValidationError({"fields": [
+                "Unknown fields: {}.".format(", ".join(unknown))]})
+        return selected
+
+    @classmethod
+    def get_columns(cls, plan=None):
+        columns = []
+        for name, column, conversion in plan or cls.get_plan():
+            if column is None:
+                columns += cls.get_columns(conversion)
+            else:
+                columns.append(column)
+        return columns
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """
+        Select just the columns of the (requested) fields and the
+        annotations, which the pagination may seek on, as dictionaries.
+
+        """
+        return queryset.values(*(cls.get_columns(cls.select_plan(fields)) +
+                                 list(queryset.query.annotations)))
+
+    def to_representation(self, row, plan=None):
+        ret = OrderedDict()
+        for name, column, conversion in plan or self.plan:
+            if column is None:
+                ret[name] = self.to_representation(row, conversion)
+                continue
+            value = row[column]
+            if conversion is not None and value is not None:
+                value = conversion(value)
+            ret[name] = value
+        return ret
+
+    @property
+    def data(self):
+        if self.many:
+            return ReturnList([self.to_representation(row)
+                               for row in self.instance], serializer=self)
+        return ReturnDict(self.to_representation(self.instance),
+                          serializer=self)
+
+
+class ReviewValuesSerializer(ValuesSerializer):
+    """ Review values serializer (same output as `ReviewSerializer`). """
+
+    serializer_class = ReviewSerializer
+
+
+class ReviewNestedValuesSerializer(ValuesSerializer):
+    """
+    Review nested values serializer (same output as
+    `ReviewNestedSerializer`).
+
+    """
+    serializer_class = ReviewNestedSerializer
+
+
+class CompanyStatsSerializer(serializers.ModelSerializer):
+    """ Company statistics model serializer. """
+
+    company = CompanySerializer()
+    histogram = serializers.DictField(child=serializers.IntegerField(),
+                                      read_only=True)
+
+    class Meta:
+        model = models.CompanyStats
+        fields = ("company", "review_count", "rating_average", "histogram")
+
+
+class LeaderboardParamsSerializer(serializers.Serializer):
+    """ Companies leaderboard query params serializer. """
+
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    min_reviews = serializers.IntegerField(min_value=1, default=1)
+
+
+class CompanyAutocompleteParamsSerializer(serializers.Serializer):
+    """ Companies autocomplete query params serializer. """
+
+    prefix = serializers.CharField(required=False, allow_blank=True,
+                                   max_length=100, trim_whitespace=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+def encode_changes_cursor(review_id):
+    """ Opaque cursor of the change feed positioned after a review id. """
+    return urlsafe_b64encode("r={}".format(review_id).encode()).decode()
+
+
+class ChangesParamsSerializer(serializers.Serializer):
+    """ Review change feed query params serializer. """
+
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
+    wait = serializers.FloatField(min_value=0, default=0)
+
+    def validate_cursor(self, value):
+        """ Id of the last review the client has. """
+        try:
+            name, review_id = urlsafe_b64decode(
+                value.encode()).decode().split("=")
+            review_id = int(review_id)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError("Invalid cursor.")
+        if name != "r" or review_id < 0:
+            raise serializers.ValidationError("Invalid cursor.")
+        return review_id
+
+
+class BatchParamsSerializer(serializers.Serializer):
+    """ Reviews batch GET query params serializer. """
+
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        """ List of the comma separated ids, in order. """
+        try:
+            ids = [int(review_id) for review_id in value.split(",")]
+        except ValueError:
+            raise serializers.ValidationError(
+                "Expected comma separated review ids.")
+        # Past a signed 64 bits integer the database driver overflows.
+        if any(review_id < 1 or review_id > 2 ** 63 - 1
+               for review_id in ids):
+            raise serializers.ValidationError(
+                "Expected comma separated review ids.")
+        if len(ids) > settings.REVIEWS_BATCH_MAX_IDS:
+            raise serializers.ValidationError(
+                "Expected at most {} ids.".format(
+                    settings.REVIEWS_BATCH_MAX_IDS))
+        return ids
+
+
+class ArchiveParamsSerializer(serializers.Serializer):
+    """ Reviews listing params deciding whether to read the archive too. """
+
+    include_archived = serializers.BooleanField(default=False)
+    submission_date__gte = serializers.DateTimeField(required=False)
+    submission_date__lte = serializers.DateTimeField(required=False)
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Sent inside the transaction that inserts reviews, for single saves as well
+# as bulk inserts (which don't send `post_save`).
+reviews_created = Signal(providing_args=["reviews", "using"])
@@ -1,11 +1,37 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+import msgpack
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.db import connection, connections, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from mixer.backend.django import mixer
-from mock import patch
+from mock import MagicMock, patch
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
-from consumers import models
+from rest_framework_jwt.settings import api_settings as jwt_settings
+from consumers import (
+    admin, cache, companies, metrics, models, renderers, search,
+    serializers, throttling)
+from consumers.authentication import token_cache
+from consumers.companies import company_cache
 
 
 class ReviewViewsTests(TestCase):
@@ -103,7 +129,7 @@ class ReviewViewsTests(TestCase):
 
         # Then
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data.get("results")), 3)
 
     def test_detail_behind_authentication(self):
         """ Test review detail endpoint requires authentication. """
@@ -263,3 +289,3144 @@ class ReviewViewsTests(TestCase):
         # Then
         self.assertEqual(response.status_code,
                          status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ReviewPaginationTests(TestCase):
+    """ Test keyset pagination of the reviews listing. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+
+    def create_reviews(self, amount, **kwargs):
+        """ Create reviews sharing timestamps in pairs (to force ties). """
+        now = timezone.now()
+        reviews = mixer.cycle(amount).blend(
+            models.Review, reviewer=self.user, company=self.company, **kwargs)
+        for index, review in enumerate(reviews):
+            models.Review.objects.filter(id=review.id).update(
+                submission_date=now - timedelta(minutes=index // 2))
+        return list(models.Review.objects.filter(
+            reviewer=self.user).order_by(
+                "-submission_date", "-id").values_list("id", flat=True))
+
+    def walk(self, params, link="next"):
+        """ Follow the pagination links returning the ids per page. """
+        pages = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([item["id"] for item in response.data["results"]])
+            if not response.data[link]:
+                return pages
+            response = self.client.get(response.data[link])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_pages(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test pages follow the default ordering without gaps. """
+        # Given
+        expected = self.create_reviews(7)
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        pages = self.walk({"page_size": 3})
+
+        # Then
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_previous(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test previous links walk back over the same pages. """
+        # Given
+        self.create_reviews(7)
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        forward = self.walk({"page_size": 3})
+        last_page = self.client.get(self.url, {"page_size": 3})
+        while last_page.data["next"]:
+            last_page = self.client.get(last_page.data["next"])
+
+        # When
+        backward = []
+        response = last_page
+        while response.data["previous"]:
+            response = self.client.get(response.data["previous"])
+            backward.insert(0, [item["id"] for item in
+                                response.data["results"]])
+
+        # Then
+        self.assertEqual(backward, forward[:-1])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_insert_while_paging(self,
+                                 jwt_value_mock, jwt_decode_mock,
+                                 jwt_cred_mock):
+        """ Test new reviews do not shift the pages of a running walk. """
+        # Given
+        expected = self.create_reviews(6)
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(self.url, {"page_size": 2})
+        seen = [item["id"] for item in response.data["results"]]
+
+        # When
+        mixer.cycle(3).blend(
+            models.Review, reviewer=self.user, company=self.company)
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            seen += [item["id"] for item in response.data["results"]]
+
+        # Then
+        self.assertEqual(seen, expected)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_filters(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test filtered listings paginate over the filtered rows only. """
+        # Given
+        self.create_reviews(5, rating=3)
+        mixer.cycle(4).blend(
+            models.Review, reviewer=self.user, company=self.company,
+            rating=1)
+        expected = list(models.Review.objects.filter(rating=3).order_by(
+            "-submission_date", "-id").values_list("id", flat=True))
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        pages = self.walk({"page_size": 2, "rating": "3",
+                           "company": self.company.id})
+
+        # Then
+        self.assertEqual(sum(pages, []), expected)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_rating_range(self,
+                          jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test ratings are filtered as numbers within a range. """
+        # Given
+        for rating in (1, 2, 3, 4, 5):
+            self.create_reviews(2, rating=rating)
+        expected = list(models.Review.objects.filter(
+            reviewer=self.user, rating__in=(2, 3, 4)).order_by(
+                "-submission_date", "-id").values_list("id", flat=True))
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(
+            self.url, {"rating__gte": "2", "rating__lte": "4"})
+
+        # Then
+        self.assertEqual([item["id"] for item in response.data["results"]],
+                         expected)
+        self.assertEqual(
+            sorted(set(item["rating"] for item in response.data["results"])),
+            [2, 3, 4])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_seek(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test following pages seek by position instead of offsetting. """
+        # Given
+        self.create_reviews(5)
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(self.url, {"page_size": 2})
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(response.data["next"])
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sql = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertIn("LIMIT 3", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_invalid_cursor(self,
+                            jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test malformed cursors are rejected. """
+        # Given
+        params = {"cursor": "cD1ub3QtYS1kYXRlJnA9MQ=="}  # p=not-a-date&p=1
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(self.url, params)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReviewQueryBudgetTests(TestCase):
+    """ Test the reviews endpoint runs a fixed amount of SQL queries. """
+
+    LIST_QUERIES = 1
+    RETRIEVE_QUERIES = 1
+    # Insert, company stats and search index (the company is validated
+    # against the company cache).
+    CREATE_QUERIES = 3
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+
+    def assert_list_budget(self, params):
+        """ Check the listing budget holds for a growing amount of rows. """
+        for amount in (1, 20):
+            mixer.cycle(amount).blend(models.Review, reviewer=self.user)
+            with self.assertNumQueries(self.LIST_QUERIES):
+                response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test listing runs a single query. """
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        self.assert_list_budget({})
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list_nested(self,
+                         jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test nested listing loads related entities in the same query. """
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        self.assert_list_budget({"nested": True})
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list_nested_columns(self,
+                                 jwt_value_mock, jwt_decode_mock,
+                                 jwt_cred_mock):
+        """ Test nested listing only selects the rendered user columns. """
+        # Given
+        mixer.blend(models.Review, reviewer=self.user)
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"nested": True})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sql = queries.captured_queries[0]["sql"]
+        self.assertIn('"auth_user"."username"', sql)
+        self.assertNotIn('"auth_user"."password"', sql)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_retrieve(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test detail runs a single query, nested or not. """
+        # Given
+        review = mixer.blend(models.Review, reviewer=self.user)
+        url = reverse("review-detail", args=[review.id])
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        # Then
+        for params in ({}, {"nested": True}):
+            with self.assertNumQueries(self.RETRIEVE_QUERIES):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_create(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test creation only inserts, with the company cached. """
+        # Given
+        mixer.blend(models.Review, company=self.company)  # Stats exist.
+        company_cache.get(self.company.id)
+        data = {"rating": 5,
+                "title": "Sample Review",
+                "summary": "This is a test only review.",
+                "company": self.company.id}
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with self.assertNumQueries(self.CREATE_QUERIES):
+            response = self.client.post(self.url, data, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class ReviewQueryPlanTests(TestCase):
+    """ Test every supported listing is served by an index. """
+
+    COMBINATIONS = (
+        {},
+        {"ordering": "submission_date"},
+        {"company": None},
+        {"company": None, "ordering": "submission_date"},
+        {"rating": "3"},
+        {"rating": "3", "ordering": "submission_date"},
+        {"company": None, "rating": "3"},
+        {"reviewer": None},
+    )
+
+    # Searched by an index too, but a range of the middle column of
+    # (reviewer, rating, submission_date) leaves the rows out of date order,
+    # so the planner may sort them after the search.
+    RANGE_COMBINATIONS = (
+        {"rating__gte": "2"},
+        {"rating__lte": "4", "ordering": "submission_date"},
+        {"rating__gte": "2", "rating__lte": "4"},
+        {"company": None, "rating__gte": "2", "rating__lte": "4"},
+    )
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+        mixer.cycle(3).blend(models.Review, reviewer=self.user,
+                             company=self.company, rating=3)
+
+    def params(self, combination):
+        """ Fill in the ids of the records created for the test. """
+        defaults = {"company": self.company.id, "reviewer": self.user.id}
+        params = {"page_size": 1}
+        for key, value in combination.items():
+            params[key] = defaults.get(key) if value is None else value
+        return params
+
+    def listing_plans(self, params):
+        """ Return the query plans of the first and second listing pages. """
+        plans = []
+        for nested in (False, True):
+            page_params = dict(params, nested=True) if nested else params
+            url = self.url
+            for _ in range(2):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, page_params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                # The next link already carries the params.
+                url, page_params = response.data["next"], None
+                sql = [query["sql"] for query in queries.captured_queries
+                       if 'FROM "consumers_review"' in query["sql"]]
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN QUERY PLAN " + sql[0])
+                    plans.append([row[-1] for row in cursor.fetchall()])
+        return plans
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_plans(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test listings search an index and never sort in a temp tree. """
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        for combination in self.COMBINATIONS:
+            for plan in self.listing_plans(self.params(combination)):
+                with self.subTest(combination=combination, plan=plan):
+                    review_steps = [step for step in plan
+                                    if "consumers_review" in step]
+                    self.assertEqual(len(review_steps), 1)
+                    self.assertTrue(review_steps[0].startswith("SEARCH"))
+                    self.assertIn("USING INDEX", review_steps[0])
+                    self.assertFalse([step for step in plan
+                                      if "TEMP B-TREE" in step])
+
+        for combination in self.RANGE_COMBINATIONS:
+            for plan in self.listing_plans(self.params(combination)):
+                with self.subTest(combination=combination, plan=plan):
+                    review_steps = [step for step in plan
+                                    if "consumers_review" in step]
+                    self.assertEqual(len(review_steps), 1)
+                    self.assertTrue(review_steps[0].startswith("SEARCH"))
+                    self.assertIn("USING INDEX", review_steps[0])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_unindexed_ordering(self,
+                                jwt_value_mock, jwt_decode_mock,
+                                jwt_cred_mock):
+        """ Test orderings without an index fall back to the default. """
+        # Given
+        expected = list(models.Review.objects.filter(
+            reviewer=self.user).order_by(
+                "-submission_date", "-id").values_list("id", flat=True))
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(self.url, {"ordering": "summary"})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]],
+                         expected)
+
+
+class ReviewBulkCreateTests(TestCase):
+    """ Test creating a list of reviews in a single request. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.another_company = models.Company.objects.create(name="Company Y")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+
+    def post(self, data):
+        return self.client.post(self.url, json.dumps(data),
+                                content_type="application/json")
+
+    def item(self, index, company=None):
+        return {"rating": 4,
+                "title": "Bulk Review {}".format(index),
+                "summary": "This is a test only review.",
+                "company": company or self.company.id}
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_create(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test every review is created for the user, in request order. """
+        # Given
+        data = [self.item(1), self.item(2, self.another_company.id),
+                self.item(3)]
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.post(data)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item["status"] for item in response.data],
+                         [status.HTTP_201_CREATED] * 3)
+        for item, result in zip(data, response.data):
+            review = models.Review.objects.get(id=result["data"]["id"])
+            self.assertEqual(review.title, item["title"])
+            self.assertEqual(review.company_id, item["company"])
+            self.assertEqual(review.reviewer, self.user)
+            self.assertEqual(review.ip_address, "127.0.0.1")
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_create_queries(self,
+                            jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test the amount of queries doesn't grow with the reviews. """
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        counts = []
+        for amount in (1, 2, 40):  # The first one creates company stats.
+            data = [self.item(index, company)
+                    for index in range(amount)
+                    for company in (self.company.id, self.another_company.id)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(data)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            counts.append(len(queries.captured_queries))
+            company_queries = [
+                query for query in queries.captured_queries
+                if 'FROM "consumers_company"' in query["sql"]]
+            # Then served by the company cache.
+            self.assertEqual(len(company_queries), 1 if amount == 1 else 0)
+
+        self.assertEqual(counts[1], counts[2])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_create_partial(self,
+                            jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test valid reviews are created and invalid ones reported. """
+        # Given
+        missing = dict(self.item(2), company=999)
+        invalid = dict(self.item(3), rating=9)
+        data = [self.item(1), missing, invalid, "review", self.item(5)]
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.post(data)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([item["status"] for item in response.data],
+                         [201, 400, 400, 400, 201])
+        self.assertIn("company", response.data[1]["errors"])
+        self.assertIn("rating", response.data[2]["errors"])
+        self.assertEqual(
+            models.Review.objects.filter(reviewer=self.user).count(), 2)
+        self.assertEqual(response.data[4]["data"]["title"], "Bulk Review 5")
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_create_invalid(self,
+                            jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test nothing is created when every review is invalid. """
+        # Given
+        data = [dict(self.item(1), company="x"), dict(self.item(2), title="")]
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.post(data)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(models.Review.objects.filter(reviewer=self.user))
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_create_limits(self,
+                           jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test empty and oversized lists are rejected. """
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        with self.settings(REVIEWS_BULK_MAX_ITEMS=2):
+            for data in ([], [self.item(1), self.item(2), self.item(3)]):
+                response = self.post(data)
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+
+        self.assertFalse(models.Review.objects.filter(reviewer=self.user))
+
+
+class CompanyStatsTests(TestCase):
+    """ Test the incrementally maintained company statistics. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.another_company = models.Company.objects.create(name="Company Y")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+
+    def review(self, rating, company=None):
+        return models.Review(rating=rating,
+                             title="Sample Review",
+                             summary="This is a test only review.",
+                             ip_address="123.123.123.123",
+                             company=company or self.company,
+                             reviewer=self.user)
+
+    def assert_stats(self, company, count, average, histogram):
+        stats = models.CompanyStats.objects.get(company=company)
+        self.assertEqual(stats.review_count, count)
+        self.assertAlmostEqual(stats.rating_average, average)
+        self.assertEqual([stats.histogram[key] for key in sorted(
+            stats.histogram)], histogram)
+
+    def test_save(self):
+        """ Test saving reviews updates the stats of their company. """
+        # When
+        for rating in (5, 4, 4):
+            self.review(rating).save()
+
+        # Then
+        self.assert_stats(self.company, 3, 13 / 3, [0, 0, 0, 2, 1])
+
+    def test_bulk_create(self):
+        """ Test reviews inserted in bulk update the stats too. """
+        # When
+        models.Review.objects.bulk_create(
+            [self.review(1), self.review(2),
+             self.review(5, self.another_company)])
+
+        # Then
+        self.assert_stats(self.company, 2, 1.5, [1, 1, 0, 0, 0])
+        self.assert_stats(self.another_company, 1, 5, [0, 0, 0, 0, 1])
+
+    def test_delete(self):
+        """ Test deleting reviews discounts them from the stats. """
+        # Given
+        reviews = models.Review.objects.bulk_create(
+            [self.review(1), self.review(3)])
+
+        # When
+        reviews[0].delete()
+        self.assert_stats(self.company, 1, 3, [0, 0, 1, 0, 0])
+        reviews[1].delete()
+
+        # Then
+        self.assert_stats(self.company, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_edit(self):
+        """ Test editing the rating or company moves the review. """
+        # Given
+        review = self.review(1)
+        review.save()
+        self.review(3).save()
+
+        # When
+        review.rating = 5
+        review.save()
+
+        # Then
+        self.assert_stats(self.company, 2, 4, [0, 0, 1, 0, 1])
+
+        # When
+        review.company = self.another_company
+        review.save()
+
+        # Then
+        self.assert_stats(self.company, 1, 3, [0, 0, 1, 0, 0])
+        self.assert_stats(self.another_company, 1, 5, [0, 0, 0, 0, 1])
+
+        # When (other columns)
+        review.title = "Edited"
+        review.save()
+        models.Review.objects.filter(pk=review.pk).first().save(
+            update_fields=["title"])
+
+        # Then
+        self.assert_stats(self.company, 1, 3, [0, 0, 1, 0, 0])
+        self.assert_stats(self.another_company, 1, 5, [0, 0, 0, 0, 1])
+
+    def test_rebuild(self):
+        """ Test the rebuild command matches the incremental stats. """
+        # Given
+        models.Review.objects.bulk_create(
+            [self.review(rating, company)
+             for rating in (1, 2, 3, 5, 5)
+             for company in (self.company, self.another_company)])
+        expected = list(models.CompanyStats.objects.order_by(
+            "company").values())
+        models.CompanyStats.objects.update(review_count=0)
+
+        # When
+        call_command("rebuild_company_stats", stdout=StringIO())
+
+        # Then
+        self.assertEqual(list(models.CompanyStats.objects.order_by(
+            "company").values()), expected)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_stats(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test the stats endpoint serves the precomputed stats. """
+        # Given
+        models.Review.objects.bulk_create([self.review(2), self.review(5)])
+        url = reverse("company-stats", args=[self.company.id])
+        empty_url = reverse("company-stats", args=[self.another_company.id])
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        empty_response = self.client.get(empty_url)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["company"]["id"], self.company.id)
+        self.assertEqual(response.data["review_count"], 2)
+        self.assertEqual(response.data["rating_average"], 3.5)
+        self.assertEqual(response.data["histogram"]["2"], 1)
+        self.assertEqual(empty_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(empty_response.data["review_count"], 0)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_leaderboard(self,
+                         jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test the leaderboard ranks by average without aggregating. """
+        # Given
+        models.Review.objects.all().delete()
+        third_company = models.Company.objects.create(name="Company Z")
+        models.Review.objects.bulk_create(
+            [self.review(3), self.review(4),
+             self.review(5, self.another_company),
+             self.review(1, third_company)])
+        url = reverse("company-leaderboard")
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"limit": 2})
+        sql = [query["sql"] for query in queries.captured_queries]
+        ranked = self.client.get(url, {"min_reviews": 2})
+        invalid = self.client.get(url, {"limit": 0})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["company"]["id"] for item in response.data],
+                         [self.another_company.id, self.company.id])
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn("GROUP BY", sql[0])
+        self.assertEqual([item["company"]["id"] for item in ranked.data],
+                         [self.company.id])
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CompanyCatalogueTests(TestCase):
+    """ Test the company lookups served from the company cache. """
+
+    def setUp(self):
+        self.companies = [models.Company.objects.create(name=name)
+                          for name in ("acme corp", "Apex", "Acme", "Beta")]
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("company-list")
+        company_cache.clear()
+
+    def get(self, url, params=None):
+        """ Response and company queries of a GET. """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        sql = [query["sql"] for query in queries.captured_queries
+               if 'FROM "consumers_company"' in query["sql"]]
+        return response, sql
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_autocomplete(self, jwt_value_mock, jwt_decode_mock,
+                          jwt_cred_mock):
+        """ Test names are matched by prefix ignoring case, then cached. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        # When
+        response, sql = self.get(self.url, {"prefix": "AC"})
+        cached, cached_sql = self.get(self.url, {"prefix": "ac"})
+        limited, _ = self.get(self.url, {"prefix": "a", "limit": 2})
+        invalid, _ = self.get(self.url, {"limit": 0})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["name"] for item in response.data],
+                         ["Acme", "acme corp"])
+        self.assertEqual(len(sql), 1)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached_sql, [])
+        self.assertEqual([item["name"] for item in limited.data],
+                         ["Acme", "acme corp"])
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_autocomplete_non_ascii(self, jwt_value_mock, jwt_decode_mock,
+                                    jwt_cred_mock):
+        """ Test prefixes the database doesn't fold aren't shared. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        models.Company.objects.create(name="\u00c9clair")
+        models.Company.objects.create(name="\u00e9lan")
+
+        # When
+        upper, _ = self.get(self.url, {"prefix": "\u00c9"})
+        lower, lower_sql = self.get(self.url, {"prefix": "\u00e9"})
+
+        # Then
+        self.assertEqual([item["name"] for item in upper.data],
+                         ["\u00c9clair"])
+        self.assertEqual([item["name"] for item in lower.data],
+                         ["\u00e9lan"])
+        self.assertEqual(len(lower_sql), 1)
+
+    def test_autocomplete_plan(self):
+        """ Test the prefix search and the sorting use the name index. """
+        # Given
+        queryset = companies.autocomplete_queryset("ac")[:10]
+
+        # When
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+
+        # Then
+        self.assertIn("consumers_company_name_nocase", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_retrieve(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test companies are cached until a company changes. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        company = self.companies[0]
+        url = reverse("company-detail", args=[company.id])
+
+        # When
+        response, sql = self.get(url)
+        cached, cached_sql = self.get(url)
+        company.name = "Acme Corporation"
+        company.save()
+        changed, changed_sql = self.get(url)
+        missing, _ = self.get(reverse("company-detail", args=[0]))
+
+        # Then
+        self.assertEqual(response.data, {"id": company.id,
+                                         "name": "acme corp"})
+        self.assertEqual((len(sql), cached_sql), (1, []))
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(changed.data["name"], "Acme Corporation")
+        self.assertEqual(len(changed_sql), 1)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_review_create(self, jwt_value_mock, jwt_decode_mock,
+                           jwt_cred_mock):
+        """ Test review creation validates the company from the cache. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        company = self.companies[0]
+        data = {"rating": 4, "title": "Cached", "summary": "Test review.",
+                "company": company.id}
+        company_cache.get(company.id)
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("review-list"),
+                                        json.dumps(data),
+                                        content_type="application/json")
+        company.delete()
+        deleted = self.client.post(reverse("review-list"), json.dumps(data),
+                                   content_type="application/json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'FROM "consumers_company"' in query["sql"]])
+        self.assertEqual(deleted.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("company", deleted.data)
+
+
+class ReviewCacheTests(TestCase):
+    """ Test the cached (and ETag tagged) review responses. """
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.another_user = User.objects.create_superuser(
+            'anothersuperuser@example.com',
+            email='anothersuperuser@example.com',
+            password='anothersuperuser')
+        self.url = reverse("review-list")
+        mixer.cycle(2).blend(models.Review, reviewer=self.user,
+                             company=self.company, rating=3)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test repeated listings are served from the cache. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(
+            self.url, {"rating": "3", "company": self.company.id})
+
+        # When
+        with self.assertNumQueries(0):
+            cached = self.client.get(
+                "{}?company={}&rating=3&page_size=".format(
+                    self.url, self.company.id))
+
+        # Then
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached["ETag"], response["ETag"])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_nested(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test nested and flat responses are cached apart. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        flat = self.client.get(self.url)
+
+        # When
+        nested = self.client.get(self.url, {"nested": True})
+
+        # Then
+        self.assertNotEqual(flat["ETag"], nested["ETag"])
+        self.assertIsInstance(nested.data["results"][0]["company"], dict)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_not_modified(self,
+                          jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test polls with a matching ETag get an empty 304. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        review = models.Review.objects.filter(reviewer=self.user).first()
+        detail_url = reverse("review-detail", args=[review.id])
+
+        for url in (self.url, detail_url):
+            etag = self.client.get(url)["ETag"]
+
+            # When
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            stale = self.client.get(url, HTTP_IF_NONE_MATCH='"other"')
+
+            # Then
+            self.assertEqual(response.status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etag)
+            self.assertEqual(stale.status_code, status.HTTP_200_OK)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_invalidation(self,
+                          jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test creating a review only expires the reviewer responses. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        etag = self.client.get(self.url)["ETag"]
+
+        # When
+        mixer.blend(models.Review, reviewer=self.another_user)
+        with self.assertNumQueries(0):
+            untouched = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.client.post(self.url, {"rating": 5,
+                                    "title": "Sample Review",
+                                    "summary": "This is a test only review.",
+                                    "company": self.company.id})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        # Then
+        self.assertEqual(untouched.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+class CachedAuthenticationTests(TestCase):
+    """ Test the JWT authentication cache. """
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user('tokenuser', password='password')
+        self.url = reverse("company-leaderboard")
+
+    def auth_header(self, user=None, **payload):
+        data = jwt_settings.JWT_PAYLOAD_HANDLER(user or self.user)
+        data.update(payload)
+        token = jwt_settings.JWT_ENCODE_HANDLER(data)
+        return {"HTTP_AUTHORIZATION": "JWT {}".format(token)}
+
+    def get(self, header):
+        """ Return the response and the user queries of a request. """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, **header)
+        user_queries = [query for query in queries.captured_queries
+                        if 'FROM "auth_user"' in query["sql"]]
+        return response, len(user_queries)
+
+    def test_cached(self):
+        """ Test verified tokens skip the user query. """
+        # Given
+        header = self.auth_header()
+
+        # When
+        first_response, first_queries = self.get(header)
+        response, queries = self.get(header)
+
+        # Then
+        self.assertEqual(first_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((first_queries, queries), (1, 0))
+
+    def test_invalid(self):
+        """ Test invalid tokens are still rejected. """
+        # Given
+        header = self.auth_header()
+        self.get(header)
+
+        # When
+        response, _ = self.get(
+            {"HTTP_AUTHORIZATION": header["HTTP_AUTHORIZATION"] + "x"})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_password_change(self):
+        """ Test changing the password drops the cached tokens. """
+        # Given
+        header = self.auth_header()
+        self.get(header)
+
+        # When
+        self.user.set_password("another")
+        self.user.save()
+        response, queries = self.get(header)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, 1)
+
+    def test_deactivation(self):
+        """ Test deactivated users can't use cached tokens. """
+        # Given
+        header = self.auth_header()
+        self.get(header)
+
+        # When
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get(header)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_other_process(self):
+        """ Test users changed by another process expire their tokens. """
+        # Given
+        header = self.auth_header()
+        self.get(header)
+
+        # When (only the shared version changes, as seen by this process)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        token_cache.invalidate_user(self.user.pk)
+        cached_entries = len(token_cache.entries)
+        response, _ = self.get(header)
+
+        # Then
+        self.assertEqual(cached_entries, 1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_expiration(self):
+        """ Test tokens aren't cached past their expiration. """
+        # Given
+        header = self.auth_header(exp=int(time.time()) + 1)
+        self.get(header)
+
+        # When
+        with patch("consumers.authentication.time.monotonic",
+                   return_value=time.monotonic() + 2):
+            _, queries = self.get(header)
+
+        # Then
+        self.assertEqual(queries, 1)
+
+    def test_size(self):
+        """ Test the least recently used tokens are evicted. """
+        # Given
+        users = [User.objects.create_user('tokenuser{}'.format(index))
+                 for index in range(3)]
+        headers = [self.auth_header(user) for user in users]
+
+        # When
+        with self.settings(AUTH_TOKEN_CACHE_SIZE=2):
+            for header in headers:
+                self.get(header)
+            _, evicted_queries = self.get(headers[0])
+            _, cached_queries = self.get(headers[2])
+
+        # Then
+        self.assertEqual((evicted_queries, cached_queries), (1, 0))
+
+
+class ReviewExportTests(TestCase):
+    """ Test the streamed review exports. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-export")
+        self.reviews = mixer.cycle(5).blend(
+            models.Review, reviewer=self.user, company=self.company)
+        mixer.cycle(2).blend(models.Review, reviewer=self.user)
+
+    def expected(self, **filters):
+        """ Serialized reviews of the user, as the listing shows them. """
+        queryset = models.Review.objects.filter(
+            reviewer=self.user, **filters).order_by("-submission_date", "-id")
+        return json.loads(json.dumps(
+            serializers.ReviewSerializer(queryset, many=True).data,
+            cls=DjangoJSONEncoder))
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_ndjson(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test NDJSON exports match the listing representation. """
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(self.url)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         self.expected())
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_csv(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test CSV exports apply the listing filters. """
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(
+            self.url, {"output": "csv", "company": self.company.id})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        expected = self.expected(company=self.company)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([int(row["id"]) for row in rows],
+                         [review["id"] for review in expected])
+        self.assertEqual(rows[0]["submission_date"],
+                         expected[0]["submission_date"])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_chunks(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test rows are read in chunks seeking from the last row. """
+        # Given
+        now = timezone.now()
+        models.Review.objects.filter(reviewer=self.user).update(
+            submission_date=now)  # Chunks must break ties by id.
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with self.settings(REVIEWS_EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(self.url)
+            with CaptureQueriesContext(connection) as queries:
+                lines = b"".join(response.streaming_content).splitlines()
+            sql = [query["sql"] for query in queries.captured_queries]
+
+        # Then
+        self.assertEqual([json.loads(line.decode())["id"] for line in lines],
+                         [review["id"] for review in self.expected()])
+        self.assertEqual(len(sql), 4)
+        self.assertFalse([query for query in sql if "OFFSET" in query])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_invalid_output(self,
+                            jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test unknown export formats are rejected. """
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(self.url, {"output": "xml"})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReviewValuesSerializerTests(TestCase):
+    """ Test the values serializers render like the model serializers. """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        mixer.cycle(5).blend(models.Review, reviewer=self.user)
+        self.queryset = models.Review.objects.filter(
+            reviewer=self.user).order_by("-submission_date", "-id")
+
+    def render(self, serializer_class):
+        eager_loading = getattr(serializer_class, "setup_eager_loading", None)
+        queryset = (eager_loading(self.queryset) if eager_loading
+                    else self.queryset)
+        return JSONRenderer().render(
+            serializer_class(queryset, many=True).data)
+
+    def test_flat(self):
+        """ Test flat rows render byte for byte as `ReviewSerializer`. """
+        self.assertEqual(self.render(serializers.ReviewValuesSerializer),
+                         self.render(serializers.ReviewSerializer))
+
+    def test_nested(self):
+        """ Test nested rows render as `ReviewNestedSerializer`. """
+        self.assertEqual(
+            self.render(serializers.ReviewNestedValuesSerializer),
+            self.render(serializers.ReviewNestedSerializer))
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test the listing uses the values serializers. """
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(reverse("review-list"), {"nested": 1})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIs(
+            response.renderer_context["view"].get_serializer_class(),
+            serializers.ReviewNestedValuesSerializer)
+        self.assertEqual(
+            JSONRenderer().render(response.data["results"]),
+            JSONRenderer().render(serializers.ReviewNestedSerializer(
+                self.queryset, many=True).data))
+
+
+class ReviewSearchTests(TestCase):
+    """ Test the full-text search of the reviews listing. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+
+    def review(self, title, summary, reviewer=None):
+        return models.Review(rating=3,
+                             title=title,
+                             summary=summary,
+                             ip_address="123.123.123.123",
+                             company=self.company,
+                             reviewer=reviewer or self.user)
+
+    def search(self, text, **params):
+        params["search"] = text
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [item["id"] for item in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            ids += [item["id"] for item in response.data["results"]]
+        return ids
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_search(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test only matching reviews are listed, most relevant first. """
+        # Given
+        weak, strong, other = models.Review.objects.bulk_create([
+            self.review("Shipping", "Long delivery, slow support."),
+            self.review("Slow delivery", "Slow, slow, slow delivery."),
+            self.review("Great", "Fast delivery."),
+        ])
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        ids = self.search("slow DELIVERY")
+
+        # Then
+        self.assertEqual(ids, [strong.id, weak.id])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_scoping(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test the search keeps to the reviews of the user. """
+        # Given
+        another_user = mixer.blend(User)
+        mine = self.review("Refund", "Refund granted.")
+        mine.save()
+        self.review("Refund", "Refund denied.", another_user).save()
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        ids = self.search("refund")
+
+        # Then
+        self.assertEqual(ids, [mine.id])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_pages(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test ranked results paginate without gaps nor repeats. """
+        # Given
+        models.Review.objects.bulk_create(
+            [self.review("Review {}".format(index),
+                         "Price " * (index % 3 + 1) + "was fine.")
+             for index in range(7)] +
+            [self.review("Unrelated", "Nothing to see.")])
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        expected = self.search("price")
+        ids = self.search("price", page_size=2)
+
+        # Then
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(ids, expected)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_syntax(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test query syntax in the search is matched as plain words. """
+        # Given
+        review = self.review("Not bad", "Not bad at all.")
+        review.save()
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        # Then
+        self.assertEqual(self.search('"not (bad*'), [review.id])
+        self.assertEqual(self.search("-"), [])
+
+    def test_single_match(self):
+        """ Test the match and the rank come from one full-text scan. """
+        # Given
+        models.Review.objects.bulk_create(
+            [self.review("Great", "Great service."),
+             self.review("Slow", "Slow service.")])
+
+        # When
+        queryset = search.search(models.Review.objects.all(), "service")
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        # Then
+        self.assertEqual(len(queryset), 2)
+        self.assertEqual(sql.count("MATCH"), 1)
+        self.assertEqual(len([step for step in plan
+                              if search.TABLE in step]), 1)
+
+    def test_sync(self):
+        """ Test the index follows created, edited and deleted reviews. """
+        # Given
+        review = self.review("Helpful", "Helpful staff.")
+        review.save()
+        self.assertEqual(list(search.search(
+            models.Review.objects.all(), "helpful")), [review])
+
+        # When
+        review.title = review.summary = "Rude staff."
+        review.save()
+
+        # Then
+        self.assertFalse(search.search(models.Review.objects.all(),
+                                       "helpful").exists())
+        review.delete()
+        self.assertFalse(search.search(models.Review.objects.all(),
+                                       "rude").exists())
+
+    def test_rebuild(self):
+        """ Test the rebuild command indexes every review again. """
+        # Given
+        review = self.review("Lost", "Lost package.")
+        review.save()
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {}".format(search.TABLE))
+
+        # When
+        call_command("rebuild_review_search", stdout=StringIO())
+
+        # Then
+        self.assertEqual(list(search.search(
+            models.Review.objects.all(), "lost")), [review])
+
+
+class ReviewBenchmarkTests(TestCase):
+    """ Test the reviews API benchmark command. """
+
+    options = {"companies": 2, "users": 3, "reviews": 20, "requests": 3,
+               "warmup": 1}
+
+    def bench(self, **options):
+        stdout = StringIO()
+        call_command("bench_reviews", stdout=stdout,
+                     **dict(self.options, **options))
+        return json.loads(stdout.getvalue())
+
+    def test_report(self):
+        """ Test every scenario is served and the data is deleted. """
+        # Given
+        review_count = models.Review.objects.count()
+
+        # When
+        report = self.bench()
+
+        # Then
+        self.assertEqual(
+            sorted(report["scenarios"]),
+            ["create", "filtered_list", "list", "nested_list", "retrieve"])
+        for result in report["scenarios"].values():
+            self.assertIn(result["status"], (200, 201))
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["queries"], 0)
+        self.assertFalse(User.objects.filter(
+            username__startswith="bench_reviews_").exists())
+        self.assertFalse(models.Company.objects.filter(
+            name__startswith="bench_reviews_").exists())
+        self.assertEqual(models.Review.objects.count(), review_count)
+        self.assertFalse(models.CompanyStats.objects.exclude(
+            company__in=models.Company.objects.all()).exists())
+
+    def test_regression(self):
+        """ Test runs slower than the baseline fail. """
+        # Given
+        baseline = self.bench()
+        for result in baseline["scenarios"].values():
+            result["p95_ms"] = 0
+
+        # When
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as output:
+            json.dump(baseline, output)
+            output.flush()
+            with self.assertRaisesRegex(CommandError, "list p95"):
+                self.bench(baseline=output.name)
+
+
+class LoadReviewsTests(TestCase):
+    """ Test the bulk loader of reviews from files. """
+
+    def setUp(self):
+        self.user = mixer.blend(User, username="loader")
+        self.company = models.Company.objects.create(name="Company X")
+        self.rows = [
+            {"rating": "4", "title": "Good", "summary": "Good service.",
+             "ip_address": "123.123.123.123", "company": "Company X",
+             "reviewer": "loader",
+             "submission_date": "2016-05-01T10:00:00+00:00"},
+            {"rating": "2", "title": "Late", "summary": "Late delivery.",
+             "ip_address": "123.123.123.123", "company": "Company New",
+             "reviewer": "loader", "submission_date": ""},
+            {"rating": "9", "title": "Bad rating", "summary": "Invalid.",
+             "ip_address": "123.123.123.123", "company": "Company X",
+             "reviewer": "loader", "submission_date": ""},
+            {"rating": "3", "title": "Unknown", "summary": "Invalid.",
+             "ip_address": "123.123.123.123", "company": "Company X",
+             "reviewer": "nobody", "submission_date": ""},
+            {"rating": "5", "title": "Great", "summary": "Great prices.",
+             "ip_address": "123.123.123.123", "company": "Company New",
+             "reviewer": "loader", "submission_date": ""},
+        ]
+
+    def write(self, extension):
+        output = tempfile.NamedTemporaryFile(
+            "w", suffix=extension, newline="", delete=False)
+        with output:
+            if extension == ".csv":
+                writer = csv.DictWriter(output, fieldnames=list(self.rows[0]))
+                writer.writeheader()
+                writer.writerows(self.rows)
+            else:
+                output.writelines(json.dumps(row) + "\n" for row in self.rows)
+        self.addCleanup(os.remove, output.name)
+        return output.name
+
+    def load(self, path, **options):
+        call_command("load_reviews", path, stdout=StringIO(),
+                     stderr=StringIO(), **options)
+        return models.Review.objects.filter(reviewer=self.user)
+
+    def test_csv(self):
+        """ Test valid rows are loaded, creating the missing companies. """
+        # When
+        reviews = self.load(self.write(".csv"), batch_size=2)
+
+        # Then
+        self.assertEqual(sorted(reviews.values_list("title", flat=True)),
+                         ["Good", "Great", "Late"])
+        new_company = models.Company.objects.get(name="Company New")
+        self.assertEqual(reviews.filter(company=new_company).count(), 2)
+        self.assertEqual(reviews.get(title="Good").submission_date.isoformat(),
+                         "2016-05-01T10:00:00+00:00")
+        self.assertEqual(new_company.stats.review_count, 2)
+        self.assertEqual(list(search.search(reviews, "prices")),
+                         [reviews.get(title="Great")])
+
+    def test_invalid_rows(self):
+        """ Test invalid rows are skipped without creating companies. """
+        # Given
+        valid = self.rows[0]
+        self.rows = [dict(valid, rating=rating, company="Company Rejected")
+                     for rating in ("4.7", 4.7, True, "")]
+        self.rows.append(dict(valid, reviewer="nobody",
+                              company="Company Rejected"))
+        self.rows.append(dict(valid, rating=5.0, title="Integral"))
+
+        # When
+        reviews = self.load(self.write(".ndjson"))
+
+        # Then
+        self.assertEqual(list(reviews.values_list("title", "rating")),
+                         [("Integral", 5)])
+        self.assertFalse(models.Company.objects.filter(
+            name="Company Rejected").exists())
+
+    def test_rebuild_after(self):
+        """ Test loads skipping per batch updates rebuild them at the end. """
+        # When
+        reviews = self.load(self.write(".ndjson"), rebuild_after=True)
+
+        # Then
+        self.assertEqual(reviews.count(), 3)
+        new_company = models.Company.objects.get(name="Company New")
+        self.assertEqual(new_company.stats.rating_average, 3.5)
+        self.assertEqual(list(search.search(reviews, "prices")),
+                         [reviews.get(title="Great")])
+
+    def test_resume(self):
+        """ Test a crashed load resumes after its last batch. """
+        # Given
+        path = self.write(".csv")
+        with patch("consumers.management.commands.load_reviews.Command."
+                   "report", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.load(path, batch_size=2)
+        self.assertEqual(self.user.review_set.count(), 2)
+
+        # When
+        reviews = self.load(path, batch_size=2)
+
+        # Then
+        self.assertEqual(sorted(reviews.values_list("title", flat=True)),
+                         ["Good", "Great", "Late"])
+        self.assertEqual(models.ReviewLoad.objects.get().loaded, 3)
+
+
+class RequestMetricsTests(TestCase):
+    """ Test the Server-Timing header and the metrics endpoint. """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+        metrics.registry.clear()
+
+    def timings(self, response):
+        """ Names of the phases in the Server-Timing header. """
+        return [entry.split(";")[0]
+                for entry in response["Server-Timing"].split(", ")]
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_server_timing(self,
+                           jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test timed views report the duration of every phase. """
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.timings(response),
+                         ["auth", "sql", "serialize", "render", "total"])
+        self.assertEqual(len(queries.captured_queries), 1)
+
+    def test_token(self):
+        """ Test the token endpoint is timed too. """
+        # When
+        response = self.client.post(
+            "/api/token/auth/",
+            {"username": "superuser@example.com", "password": "superuser"})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("auth", self.timings(response))
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_metrics(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test timed requests are aggregated in histograms. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.login(username="superuser@example.com",
+                          password="superuser")
+
+        # When
+        response = self.client.get(reverse("metrics"))
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = response.content.decode().splitlines()
+        self.assertIn("# TYPE reviews_request_phase_seconds histogram", lines)
+        self.assertIn('reviews_request_phase_seconds_count{phase="total",'
+                      'view="ReviewViewSet.list"} 2', lines)
+        self.assertIn('reviews_request_queries_bucket{'
+                      'view="ReviewViewSet.list",le="1.0"} 2', lines)
+
+    def test_metrics_permission(self):
+        """ Test only admin users can read the metrics. """
+        # Given
+        User.objects.create_user("staffless", password="staffless")
+        self.client.login(username="staffless", password="staffless")
+
+        # When
+        response = self.client.get(reverse("metrics"))
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_sampling(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test requests left out of the sample aren't timed. """
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with self.settings(METRICS_SAMPLE_RATE=0):
+            response = self.client.get(self.url)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(metrics.registry.render().count("_count"), 0)
+
+
+@override_settings(REVIEWS_READ_DATABASES=["replica"])
+class ReplicaRoutingTests(TestCase):
+    """
+    Test reads are routed to the replica (a separate SQLite file which is
+    "replicated" by saving the same rows on it).
+
+    """
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.company = models.Company.objects.create(name="Company X")
+        self.replicate(self.user, self.company)
+        self.url = reverse("review-list")
+        cache.get_cache().clear()
+
+    def replicate(self, *objs):
+        for obj in objs:
+            obj.save(using="replica")
+            # Keep new related objects (following their relations) on the
+            # primary.
+            obj._state.db = "default"
+
+    def review(self, title):
+        return models.Review(rating=3,
+                             title=title,
+                             summary="This is a test only review.",
+                             ip_address="123.123.123.123",
+                             company=self.company,
+                             reviewer=self.user)
+
+    def list_titles(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["title"] for item in response.data["results"]]
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test listings are read from the replica. """
+        # Given
+        self.review("Primary only").save()
+        self.replicate(self.review("Replicated"))
+        cache.get_cache().clear()  # Past the read-your-writes window.
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        with CaptureQueriesContext(connections["default"]) as primary:
+            titles = self.list_titles()
+
+        # Then
+        self.assertEqual(titles, ["Replicated"])
+        self.assertFalse([query for query in primary.captured_queries
+                          if "consumers_review" in query["sql"]])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_retrieve(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test details are read from the replica. """
+        # Given
+        review = self.review("Replicated")
+        self.replicate(review)
+        cache.get_cache().clear()  # Past the read-your-writes window.
+
+        # When
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        response = self.client.get(
+            reverse("review-detail", args=[review.id]))
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Replicated")
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_read_your_writes(self,
+                              jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test writers read from the primary during the window. """
+        # Given
+        data = json.dumps({"rating": 5,
+                           "title": "Just written",
+                           "summary": "This is a test only review.",
+                           "company": self.company.id})
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        # When
+        response = self.client.post(self.url, data,
+                                    content_type="application/json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(models.Review.objects.using("default").filter(
+            title="Just written").exists())
+        self.assertFalse(models.Review.objects.using("replica").filter(
+            title="Just written").exists())
+        self.assertEqual(self.list_titles(), ["Just written"])
+        with self.settings(REVIEWS_READ_YOUR_WRITES_WINDOW=0):
+            cache.get_cache().clear()
+            self.assertEqual(self.list_titles(), [])
+
+
+@override_settings(REVIEWS_QUEUE_WRITES=True)
+class ReviewQueueTests(TestCase):
+    """ Test queueing review submissions and processing the queue. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+        self.data = {"rating": 4,
+                     "title": "Queued review",
+                     "summary": "This is a test only review.",
+                     "company": self.company.id}
+
+    def submit(self, data):
+        return self.client.post(self.url, json.dumps(data),
+                                content_type="application/json")
+
+    def process(self):
+        out = StringIO()
+        call_command("process_review_queue", "--once", stdout=out)
+        return out.getvalue()
+
+    def test_submission_dates(self):
+        """ Test only the flagged reviews keep the date they carry. """
+        # Given
+        date = timezone.now() - timedelta(days=30)
+        reviews = [models.Review(rating=4,
+                                 title="Dated review",
+                                 summary="This is a test only review.",
+                                 ip_address="123.123.123.123",
+                                 company=self.company,
+                                 reviewer=self.user,
+                                 submission_date=date)
+                   for _ in range(3)]
+        reviews[0].keep_submission_date = True
+        reviews[1].keep_submission_date = True
+
+        # When
+        models.Review.objects.bulk_create(reviews[1:])
+        reviews[0].save()
+
+        # Then
+        self.assertEqual(
+            [models.Review.objects.get(pk=review.pk).submission_date == date
+             for review in reviews],
+            [True, True, False])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_enqueue(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test a review is queued and its ticket returned. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        # When
+        response = self.submit(self.data)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "pending")
+        self.assertIsNone(response.data["review"])
+        self.assertTrue(response["Location"].endswith(reverse(
+            "reviewsubmission-detail", args=[response.data["ticket"]])))
+        self.assertFalse(models.Review.objects.filter(
+            title="Queued review").exists())
+        submission = models.ReviewSubmission.objects.get()
+        self.assertEqual(submission.reviewer, self.user)
+        self.assertEqual(json.loads(submission.data), self.data)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_enqueue_invalid(self,
+                             jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test invalid reviews are rejected instead of queued. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        # When
+        response = self.submit(dict(self.data, rating=6))
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("rating", response.data)
+        self.assertFalse(models.ReviewSubmission.objects.exists())
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_process(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test the worker creates the queued reviews. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        gone = models.Company.objects.create(name="Company Gone")
+        tickets = [self.submit(self.data).data["ticket"],
+                   self.submit(dict(self.data, company=gone.id)).data[
+                       "ticket"]]
+        gone.delete()
+        submitted = models.ReviewSubmission.objects.get(
+            ticket=tickets[0]).submitted
+
+        # When
+        output = self.process()
+        created, failed = [self.client.get(reverse(
+            "reviewsubmission-detail", args=[ticket])).data
+            for ticket in tickets]
+
+        # Then
+        self.assertIn("Processed 2 submissions in total.", output)
+        review = models.Review.objects.get(title="Queued review")
+        self.assertEqual(created["status"], "created")
+        self.assertEqual(created["review"], review.id)
+        self.assertEqual(review.reviewer, self.user)
+        self.assertEqual(review.submission_date, submitted)
+        self.assertEqual(self.company.stats.review_count, 1)
+        self.assertEqual(failed["status"], "failed")
+        self.assertIsNone(failed["review"])
+        self.assertIn("company", failed["validation_errors"])
+        self.assertFalse(models.ReviewSubmission.objects.filter(
+            status="pending").exists())
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_worker_crash(self,
+                          jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test a batch interrupted by a crash is processed again. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        self.submit(self.data)
+        self.submit(dict(self.data, title="Another queued review"))
+
+        # When (crashing after inserting the reviews)
+        with patch.object(models.ReviewSubmission, "save",
+                          side_effect=RuntimeError("crash")):
+            with self.assertRaises(RuntimeError):
+                self.process()
+        pending = models.ReviewSubmission.objects.filter(
+            status="pending").count()
+        created = models.Review.objects.filter(
+            summary="This is a test only review.").count()
+        self.process()
+
+        # Then
+        self.assertEqual(pending, 2)
+        self.assertEqual(created, 0)
+        self.assertEqual(models.Review.objects.filter(
+            title="Queued review").count(), 1)
+        self.assertEqual(models.Review.objects.filter(
+            title="Another queued review").count(), 1)
+        self.assertEqual(models.ReviewSubmission.objects.filter(
+            status="created").count(), 2)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_status_of_other_user(self,
+                                  jwt_value_mock, jwt_decode_mock,
+                                  jwt_cred_mock):
+        """ Test users can only see their own submissions. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        ticket = self.submit(self.data).data["ticket"]
+
+        # When
+        jwt_cred_mock.return_value = User.objects.get(username="user1")
+        response = self.client.get(reverse("reviewsubmission-detail",
+                                           args=[ticket]))
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReviewSparseFieldsTests(TestCase):
+    """ Test the `fields` param limits the output and the selected columns. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+        self.reviews = mixer.cycle(3).blend(models.Review, reviewer=self.user,
+                                            company=self.company, rating=3)
+
+    def get(self, url, params):
+        """ Response and SQL of the reviews query of a GET. """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        sql = [query["sql"] for query in queries.captured_queries
+               if 'FROM "consumers_review' in query["sql"] and
+               "consumers_reviewsubmission" not in query["sql"]]
+        return response, sql
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test listings only return and select the requested fields. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        params = {"fields": "id,title,company", "page_size": 2}
+
+        # When
+        response, sql = self.get(self.url, params)
+        next_response, _ = self.get(response.data["next"], None)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([list(item) for item in response.data["results"]],
+                         [["id", "company", "title"]] * 2)
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('"summary"', sql[0])
+        self.assertNotIn('"ip_address"', sql[0])
+        self.assertEqual(
+            [item["id"] for item in response.data["results"] +
+             next_response.data["results"]],
+            [review.id for review in sorted(
+                self.reviews, key=lambda review: (review.submission_date,
+                                                  review.id),
+                reverse=True)])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_nested(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test dotted fields select nested fields only. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        params = {"fields": "id,company.name", "nested": True}
+
+        # When
+        response, sql = self.get(self.url, params)
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0], {
+            "id": response.data["results"][0]["id"],
+            "company": {"name": "Company X"}})
+        self.assertNotIn('"summary"', sql[0])
+        self.assertNotIn('"auth_user"', sql[0])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_retrieve(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test details only return and select the requested fields. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        review = self.reviews[0]
+
+        # When
+        response, sql = self.get(reverse("review-detail", args=[review.id]),
+                                 {"fields": "title,rating"})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"rating": review.rating,
+                                         "title": review.title})
+        self.assertNotIn('"summary"', sql[0])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_export(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test exports only include the requested fields. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        # When
+        response = self.client.get(reverse("review-export"),
+                                   {"output": "csv", "fields": "id,rating"})
+        rows = list(csv.reader(
+            b"".join(response.streaming_content).decode().splitlines()))
+
+        # Then
+        self.assertEqual(rows[0], ["id", "rating"])
+        self.assertEqual(len(rows), 4)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_unknown_fields(self,
+                            jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test unknown fields are rejected. """
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        for params in ({"fields": "id,votes"},
+                       {"fields": "company.name"},
+                       {"fields": "company.votes", "nested": True}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+                self.assertIn("fields", response.data)
+
+
+class AdminTests(TestCase):
+    """ Test the admin pages run the same queries on any amount of rows. """
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username="admin"))
+        self.review = models.Review.objects.first()
+
+    def get(self, url, params=None):
+        """ SQL of the queries of a GET (with the content types cached). """
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query["sql"] for query in queries.captured_queries]
+
+    def test_changelist(self):
+        """ Test the review changelist loads relations and counts bounded. """
+        # Given
+        url = reverse("admin:consumers_review_changelist")
+        params = {"rating__exact": 3, "q": "review"}
+        few, few_filtered = self.get(url), self.get(url, params)
+
+        # When (each review of a different company and reviewer)
+        mixer.cycle(30).blend(models.Review, rating=3)
+        many, filtered = self.get(url), self.get(url, params)
+
+        # Then
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(few_filtered), len(filtered))
+        counts = [sql for sql in many + filtered if "COUNT(" in sql]
+        self.assertTrue(counts)
+        for sql in counts:
+            self.assertIn("LIMIT", sql)
+
+    def test_change_form(self):
+        """ Test the review form doesn't list every user and company. """
+        # Given
+        url = reverse("admin:consumers_review_change",
+                      args=[self.review.id])
+        few = self.get(url)
+
+        # When
+        mixer.cycle(30).blend(User)
+        mixer.cycle(30).blend(models.Company)
+        many = self.get(url)
+
+        # Then
+        self.assertEqual(len(few), len(many))
+        for sql in many:
+            if 'FROM "auth_user"' in sql or 'FROM "consumers_company"' in sql:
+                self.assertIn("WHERE", sql)
+
+    def test_company_changelist(self):
+        """ Test the company changelist counts bounded. """
+        # Given
+        url = reverse("admin:consumers_company_changelist")
+        few = self.get(url)
+
+        # When
+        mixer.cycle(30).blend(models.Company)
+        many = self.get(url, {"q": "Comp"})
+
+        # Then
+        self.assertEqual(len(few), len(many))
+        for sql in many:
+            if "COUNT(" in sql:
+                self.assertIn("LIMIT", sql)
+
+    def test_date_hierarchy(self):
+        """ Test the periods found through the index are the right ones. """
+        # Given
+        mixer.cycle(6).blend(models.Review, rating=3)
+        for index, review in enumerate(models.Review.objects.all()):
+            models.Review.objects.filter(pk=review.pk).update(
+                submission_date=timezone.now() - timedelta(days=45 * index,
+                                                           hours=index))
+        queryset = admin.IndexedDatesQuerySet(model=models.Review)
+
+        for kind in ("year", "month", "day"):
+            for order in ("ASC", "DESC"):
+                with self.subTest(kind=kind, order=order):
+                    # When
+                    periods = queryset.datetimes("submission_date", kind,
+                                                 order)
+
+                    # Then
+                    self.assertEqual(periods, list(
+                        models.Review.objects.datetimes("submission_date",
+                                                        kind, order)))
+
+
+class ReviewChangeFeedTests(TestCase):
+    """ Test the change feed returns the new reviews of the user. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.other_user = User.objects.create_user("other", password="other")
+        self.url = reverse("review-changes")
+        self.reviews = mixer.cycle(3).blend(models.Review, reviewer=self.user,
+                                            company=self.company)
+        mixer.blend(models.Review, reviewer=self.other_user,
+                    company=self.company)
+
+    def authenticate(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_pages(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test the cursor pages through the reviews of the user only. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+
+        # When
+        first = self.client.get(self.url, {"limit": 2})
+        second = self.client.get(self.url, {"limit": 2,
+                                            "cursor": first.data["cursor"]})
+        last = self.client.get(self.url, {"cursor": second.data["cursor"]})
+
+        # Then
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in first.data["results"] +
+             second.data["results"]],
+            [review.id for review in self.reviews])
+        self.assertTrue(first.data["has_more"])
+        self.assertFalse(second.data["has_more"])
+        self.assertEqual(last.data["results"], [])
+        self.assertEqual(last.data["cursor"], second.data["cursor"])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_new_reviews(self, jwt_value_mock, jwt_decode_mock,
+                         jwt_cred_mock):
+        """ Test reviews created after the cursor (even dated before). """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+        cursor = self.client.get(self.url).data["cursor"]
+        review = mixer.blend(
+            models.Review, reviewer=self.user, company=self.company,
+            submission_date=timezone.now() - timedelta(days=30))
+
+        # When
+        response = self.client.get(self.url, {"cursor": cursor})
+
+        # Then
+        self.assertEqual([item["id"] for item in response.data["results"]],
+                         [review.id])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_invalid_params(self, jwt_value_mock, jwt_decode_mock,
+                            jwt_cred_mock):
+        """ Test invalid cursors and limits are rejected. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+
+        for params, field in (({"cursor": "nope"}, "cursor"),
+                              ({"cursor": "eD0x"}, "cursor"),
+                              ({"limit": 0}, "limit"),
+                              ({"wait": -1}, "wait")):
+            with self.subTest(params=params):
+                # When
+                response = self.client.get(self.url, params)
+
+                # Then
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+                self.assertIn(field, response.data)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_long_poll(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test waiting returns the reviews created meanwhile. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+        cursor = self.client.get(self.url).data["cursor"]
+        created = []
+
+        def create_review(seconds):
+            if not created:
+                created.append(mixer.blend(
+                    models.Review, reviewer=self.user, company=self.company))
+
+        # When
+        with patch.object(cache.time, "sleep",
+                          side_effect=create_review) as sleep_mock:
+            response = self.client.get(self.url, {"cursor": cursor,
+                                                  "wait": 5})
+
+        # Then
+        self.assertEqual([item["id"] for item in response.data["results"]],
+                         [created[0].id])
+        self.assertEqual(sleep_mock.call_count, 1)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_long_poll_timeout(self, jwt_value_mock, jwt_decode_mock,
+                               jwt_cred_mock):
+        """ Test waiting ends empty when only other users' reviews change. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+        cursor = self.client.get(self.url).data["cursor"]
+        mixer.blend(models.Review, reviewer=self.other_user,
+                    company=self.company)
+
+        # When
+        started = time.monotonic()
+        response = self.client.get(self.url, {"cursor": cursor,
+                                              "wait": 0.3})
+        elapsed = time.monotonic() - started
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(response.data["cursor"], cursor)
+        self.assertGreaterEqual(elapsed, 0.3)
+
+
+class ReviewBatchTests(TestCase):
+    """ Test the batch GET returns the requested reviews in order. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.other_user = User.objects.create_user("other", password="other")
+        self.url = reverse("review-batch")
+        self.reviews = mixer.cycle(3).blend(models.Review, reviewer=self.user,
+                                            company=self.company)
+        self.other_review = mixer.blend(models.Review,
+                                        reviewer=self.other_user,
+                                        company=self.company)
+
+    def get(self, params):
+        """ Response and reviews queries of a batch GET. """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        sql = [query["sql"] for query in queries.captured_queries
+               if 'FROM "consumers_review' in query["sql"] and
+               "consumers_reviewsubmission" not in query["sql"]]
+        return response, sql
+
+    def ids(self, *reviews):
+        return ",".join(str(getattr(review, "id", review))
+                        for review in reviews)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_batch(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test missing and other users' reviews are marked per item. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        first, _, last = self.reviews
+
+        # When
+        missing = 2 ** 63 - 1
+        response, sql = self.get({"ids": self.ids(
+            last, missing, self.other_review, first, last)})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["id"], item["status"]) for item in response.data],
+            [(last.id, 200), (missing, 404), (self.other_review.id, 404),
+             (first.id, 200), (last.id, 200)])
+        self.assertEqual(response.data[0]["data"]["title"], last.title)
+        self.assertEqual(response.data[3]["data"]["id"], first.id)
+        self.assertEqual(len(sql), 1)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_nested_fields(self, jwt_value_mock, jwt_decode_mock,
+                           jwt_cred_mock):
+        """ Test the nested output and sparse fieldsets. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        review = self.reviews[0]
+
+        # When
+        nested, _ = self.get({"ids": self.ids(review), "nested": True})
+        sparse, _ = self.get({"ids": self.ids(review),
+                              "fields": "title,company.name",
+                              "nested": True})
+
+        # Then
+        self.assertEqual(nested.data[0]["data"]["company"],
+                         {"id": self.company.id, "name": "Company X"})
+        self.assertEqual(sparse.data[0]["data"],
+                         {"title": review.title,
+                          "company": {"name": "Company X"}})
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_cached(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test cached reviews aren't queried again until reviews change. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+        first, second, _ = self.reviews
+        self.get({"ids": self.ids(first)})
+
+        # When
+        partial, partial_sql = self.get({"ids": self.ids(first, second)})
+        cached, cached_sql = self.get({"ids": self.ids(second, first)})
+        mixer.blend(models.Review, reviewer=self.user, company=self.company)
+        expired, expired_sql = self.get({"ids": self.ids(first)})
+
+        # Then
+        self.assertEqual(len(partial_sql), 1)
+        self.assertIn("IN ({})".format(second.id), partial_sql[0])
+        self.assertEqual(cached_sql, [])
+        self.assertEqual([item["id"] for item in cached.data],
+                         [second.id, first.id])
+        self.assertEqual(len(expired_sql), 1)
+        self.assertEqual(expired.data[0]["status"], status.HTTP_200_OK)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    @override_settings(REVIEWS_BATCH_MAX_IDS=2)
+    def test_invalid(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test invalid and too many ids are rejected. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        for ids in (None, "1,a", "1,2,3"):
+            with self.subTest(ids=ids):
+                # When
+                response, _ = self.get({"ids": ids} if ids else {})
+
+                # Then
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+                self.assertIn("ids", response.data)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_out_of_range(self, jwt_value_mock, jwt_decode_mock,
+                          jwt_cred_mock):
+        """ Test ids the database can't store are rejected. """
+        # Given
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+        for ids in ("99999999999999999999999", "{},-1".format(
+                self.reviews[0].id), "0"):
+            with self.subTest(ids=ids):
+                # When
+                response, _ = self.get({"ids": ids})
+
+                # Then
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+                self.assertIn("ids", response.data)
+
+
+class RenderingTests(TestCase):
+    """ Test the negotiated renderers, parser and response compression. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.url = reverse("review-list")
+        mixer.cycle(3).blend(models.Review, reviewer=self.user,
+                             company=self.company, summary="Long " * 500)
+
+    def authenticate(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+    def test_json_output(self):
+        """ Test the fast JSON renderer gives the output of DRF's. """
+        # Given
+        data = {"text": "caf\u00e9 \u2028 </script>", "float": 13 / 3,
+                "decimal": Decimal("1.50"), "lazy": gettext_lazy("Not found."),
+                "nested": [{"id": 1, "none": None, "bool": True}]}
+
+        for media_type in ("application/json",
+                           "application/json; indent=4"):
+            with self.subTest(media_type=media_type):
+                # When
+                content = renderers.RapidJSONRenderer().render(data,
+                                                               media_type)
+
+                # Then
+                self.assertEqual(json.loads(content.decode()), json.loads(
+                    JSONRenderer().render(data, media_type).decode()))
+                self.assertIn(b"\\u2028", content)
+                self.assertEqual(b"\n" in content, "indent" in media_type)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_msgpack(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test MessagePack is rendered when accepted. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+
+        # When
+        response = self.client.get(self.url,
+                                   HTTP_ACCEPT="application/msgpack")
+        default = self.client.get(self.url)
+
+        # Then
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(default["Content-Type"], "application/json")
+        self.assertEqual(msgpack.unpackb(response.content, encoding="utf-8"),
+                         json.loads(default.content.decode()))
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_parser(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test JSON bodies are parsed, and invalid ones rejected. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+        data = {"rating": 5, "title": "Café", "summary": "Parsed.",
+                "company": self.company.id}
+
+        # When
+        created = self.client.post(self.url, json.dumps(data),
+                                   content_type="application/json")
+        invalid = self.client.post(self.url, "{invalid",
+                                   content_type="application/json")
+
+        # Then
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(created.data["title"], "Café")
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("JSON parse error", invalid.data["detail"])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_gzip(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test large responses are gzipped for clients accepting it. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+
+        # When
+        plain = self.client.get(self.url)
+        gzipped = self.client.get(self.url,
+                                  HTTP_ACCEPT_ENCODING="deflate, gzip")
+        refused = self.client.get(self.url,
+                                  HTTP_ACCEPT_ENCODING="gzip;q=0, deflate")
+        with override_settings(GZIP_MIN_LENGTH=len(plain.content) + 1):
+            small = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        not_modified = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=gzipped["ETag"])
+
+        # Then
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+        self.assertLess(len(gzipped.content), len(plain.content))
+        self.assertIn("Accept-Encoding", gzipped["Vary"])
+        for response in (plain, refused, small):
+            self.assertFalse(response.has_header("Content-Encoding"))
+            self.assertEqual(response.content, plain.content)
+        self.assertIn("Accept-Encoding", refused["Vary"])
+        self.assertEqual(not_modified.status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+    def test_benchmark(self):
+        """ Test the renderers benchmark reports every renderer. """
+        # Given
+        stdout = StringIO()
+
+        # When
+        call_command("bench_renderers", page_sizes=[2], summary_length=100,
+                     repeat=1, stdout=stdout)
+        report = json.loads(stdout.getvalue())
+
+        # Then
+        self.assertEqual(sorted(report["2"]),
+                         ["json", "msgpack", "rapidjson"])
+        self.assertEqual(report["2"]["json"]["bytes"],
+                         report["2"]["rapidjson"]["bytes"])
+        self.assertFalse(User.objects.filter(
+            username="bench_renderers_user").exists())
+
+
+class ReviewArchiveTests(TestCase):
+    """ Test archiving old reviews and reading them back through the API. """
+
+    def setUp(self):
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_superuser(
+            'superuser@example.com',
+            email='superuser@example.com',
+            password='superuser')
+        self.other_user = User.objects.create_user("other", password="other")
+        self.url = reverse("review-list")
+        self.old = mixer.cycle(3).blend(
+            models.Review, reviewer=self.user, company=self.company,
+            title=mixer.sequence("Archived {0}"))
+        self.other_old = mixer.blend(models.Review, reviewer=self.other_user,
+                                     company=self.company)
+        self.recent = mixer.cycle(2).blend(
+            models.Review, reviewer=self.user, company=self.company)
+        self.old_date = timezone.now() - timedelta(days=400)
+        for days, review in enumerate(self.old + [self.other_old]):
+            models.Review.objects.filter(id=review.id).update(
+                submission_date=self.old_date - timedelta(days=days))
+
+    def archive(self):
+        stdout = StringIO()
+        # Required options can't be given as keywords on this Django.
+        call_command("archive_reviews", "--older-than", "365",
+                     "--batch-size", "2", stdout=stdout)
+        return stdout.getvalue()
+
+    def authenticate(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        jwt_value_mock.return_value = True
+        jwt_decode_mock.return_value = True
+        jwt_cred_mock.return_value = self.user
+
+    def list_ids(self, params):
+        """ Ids of every page of a listing, and its reviews queries. """
+        ids, sql, url = [], [], self.url
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [item["id"] for item in response.data["results"]]
+            sql += [query["sql"] for query in queries.captured_queries
+                    if 'FROM "consumers_review' in query["sql"]]
+            url, params = response.data["next"], None
+        return ids, sql
+
+    def test_archive(self):
+        """ Test old reviews are moved, keeping their ids and stats. """
+        # Given
+        stats = models.CompanyStats.objects.get(company=self.company)
+
+        # When
+        output = self.archive()
+
+        # Then
+        self.assertIn("Archived 4 reviews", output)
+        self.assertEqual(
+            sorted(models.ArchivedReview.objects.values_list("id",
+                                                             flat=True)),
+            sorted(review.id for review in self.old + [self.other_old]))
+        self.assertEqual(
+            sorted(models.Review.objects.filter(
+                reviewer=self.user).values_list("id", flat=True)),
+            sorted(review.id for review in self.recent))
+        archived = models.ArchivedReview.objects.get(id=self.old[0].id)
+        self.assertEqual(archived.title, self.old[0].title)
+        self.assertEqual(archived.submission_date, self.old_date)
+        self.assertEqual(models.CompanyStats.objects.get(
+            company=self.company).review_count, stats.review_count)
+        models.CompanyStats.objects.rebuild()
+        self.assertEqual(models.CompanyStats.objects.get(
+            company=self.company).review_count, stats.review_count)
+        self.assertIn("Archived 0 reviews", self.archive())
+
+    def test_search_rebuild(self):
+        """ Test rebuilding the search index keeps the archived reviews. """
+        # Given
+        self.archive()
+
+        # When
+        call_command("rebuild_review_search", stdout=StringIO())
+
+        # Then
+        self.assertEqual(
+            list(search.search(models.ReviewWithArchived.objects.filter(
+                title="Archived 1"), "archived").values_list("id",
+                                                             flat=True)),
+            [self.old[1].id])
+
+    def test_submissions(self):
+        """ Test queued submissions of archived reviews are unlinked. """
+        # Given
+        submissions = [models.ReviewSubmission.objects.create(
+            status=models.ReviewSubmission.CREATED, data="{}",
+            ip_address="123.123.123.123", reviewer=self.user, review=review)
+            for review in (self.old[0], self.recent[0])]
+
+        # When
+        self.archive()
+
+        # Then
+        self.assertEqual(
+            [models.ReviewSubmission.objects.get(
+                pk=submission.pk).review_id for submission in submissions],
+            [None, self.recent[0].id])
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_list(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test listings read the archive only when asked for. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+        self.archive()
+        recent = [review.id for review in reversed(self.recent)]
+        old = [review.id for review in self.old]
+
+        # When
+        hot, hot_sql = self.list_ids({"page_size": 2})
+        spanning, spanning_sql = self.list_ids(
+            {"page_size": 2, "include_archived": "true"})
+        searched, _ = self.list_ids({"include_archived": "true",
+                                     "search": "archived"})
+
+        # Then
+        self.assertEqual(hot, recent)
+        self.assertFalse([sql for sql in hot_sql
+                          if "consumers_review_with_archived" in sql])
+        self.assertEqual(spanning, recent + old)
+        self.assertTrue(all("consumers_review_with_archived" in sql
+                            for sql in spanning_sql))
+        self.assertEqual(sorted(searched), sorted(old))
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_date_range(self, jwt_value_mock, jwt_decode_mock,
+                        jwt_cred_mock):
+        """ Test date ranges covering archived reviews read the archive. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+        self.archive()
+        last_week = (timezone.now() - timedelta(days=7)).isoformat()
+        old_day = (self.old_date - timedelta(days=1)).isoformat()
+
+        # When
+        recent, recent_sql = self.list_ids(
+            {"submission_date__gte": last_week})
+        old, old_sql = self.list_ids({"submission_date__gte": old_day,
+                                      "submission_date__lte": last_week})
+        invalid = self.client.get(self.url, {"submission_date__gte": "x"})
+
+        # Then
+        self.assertEqual(sorted(recent),
+                         sorted(review.id for review in self.recent))
+        self.assertFalse([sql for sql in recent_sql
+                          if "consumers_review_with_archived" in sql])
+        self.assertEqual(old, [review.id for review in self.old[:2]])
+        self.assertTrue([sql for sql in old_sql
+                         if "consumers_review_with_archived" in sql])
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("submission_date__gte", invalid.data)
+
+    @patch.object(JSONWebTokenAuthentication, "authenticate_credentials")
+    @patch("rest_framework_jwt.authentication.jwt_decode_handler")
+    @patch.object(JSONWebTokenAuthentication, "get_jwt_value")
+    def test_retrieve(self, jwt_value_mock, jwt_decode_mock, jwt_cred_mock):
+        """ Test archived reviews are found by id, for their reviewer. """
+        # Given
+        self.authenticate(jwt_value_mock, jwt_decode_mock, jwt_cred_mock)
+        self.archive()
+
+        # When
+        response = self.client.get(
+            reverse("review-detail", args=[self.old[0].id]),
+            {"nested": True})
+        other = self.client.get(
+            reverse("review-detail", args=[self.other_old.id]))
+        batch = self.client.get(reverse("review-batch"), {
+            "ids": "{},{}".format(self.old[1].id, self.recent[0].id)})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], self.old[0].title)
+        self.assertEqual(response.data["company"]["name"], "Company X")
+        self.assertEqual(other.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual([item["status"] for item in batch.data],
+                         [status.HTTP_200_OK, status.HTTP_200_OK])
+
+
+def throttle_rates(**rates):
+    """ Settings override with the given throttle rates only. """
+    return override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates))
+
+
+class ThrottlingTests(TestCase):
+    """ Test the token bucket throttles of review and token creation. """
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.company = models.Company.objects.create(name="Company X")
+        self.user = User.objects.create_user('throttled', password='password')
+        self.url = reverse("review-list")
+        self.data = json.dumps({"rating": 4,
+                                "title": "Throttled review",
+                                "summary": "This is a test only review.",
+                                "company": self.company.id})
+        self.now = 1000.0
+        timer = patch.object(throttling.TokenBucketThrottle, "timer",
+                             side_effect=lambda: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+
+    def tearDown(self):
+        cache.get_cache().clear()
+
+    def post(self, user=None, **extra):
+        token = jwt_settings.JWT_ENCODE_HANDLER(
+            jwt_settings.JWT_PAYLOAD_HANDLER(user or self.user))
+        return self.client.post(self.url, self.data,
+                                content_type="application/json",
+                                HTTP_AUTHORIZATION="JWT {}".format(token),
+                                **extra)
+
+    @throttle_rates(review_create_user="2/min")
+    def test_per_user(self):
+        """ Test users get a burst of creations refilled over time. """
+        # Given
+        statuses = [self.post().status_code for _ in range(3)]
+        response = self.post()
+
+        # When
+        self.now += 30
+        refilled = self.post().status_code
+        other = self.post(User.objects.get(username="user1")).status_code
+
+        # Then
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * 2 +
+                         [status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(refilled, status.HTTP_201_CREATED)
+        self.assertEqual(self.post().status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other, status.HTTP_201_CREATED)
+        self.assertEqual(models.Review.objects.filter(
+            title="Throttled review").count(), 4)
+
+    @throttle_rates(review_create_ip="2/min")
+    def test_per_ip(self):
+        """ Test creations are limited per IP (and IPv6 /64 network). """
+        # Given
+        other_user = User.objects.get(username="user1")
+
+        # When
+        statuses = [
+            self.post(REMOTE_ADDR="2001:db8::1").status_code,
+            self.post(other_user, REMOTE_ADDR="2001:db8::2").status_code,
+            self.post(other_user, REMOTE_ADDR="2001:db8::3").status_code,
+            self.post(REMOTE_ADDR="2001:db8:0:1::1").status_code,
+            self.post(REMOTE_ADDR="203.0.113.1").status_code,
+        ]
+
+        # Then
+        self.assertEqual(statuses, [status.HTTP_201_CREATED,
+                                    status.HTTP_201_CREATED,
+                                    status.HTTP_429_TOO_MANY_REQUESTS,
+                                    status.HTTP_201_CREATED,
+                                    status.HTTP_201_CREATED])
+        self.assertEqual(
+            sorted(models.Review.objects.filter(
+                title="Throttled review").values_list(
+                    "ip_address", flat=True)),
+            ["2001:db8:0:1::1", "2001:db8::1", "2001:db8::2", "203.0.113.1"])
+
+    @throttle_rates(review_create_user="10/min")
+    def test_single_round_trip(self):
+        """ Test taking a token is a single cache operation. """
+        # Given
+        self.post()
+        throttle_cache = MagicMock(wraps=cache.get_cache())
+
+        # When
+        with patch.object(throttling.TokenBucketThrottle, "cache",
+                          throttle_cache):
+            response = self.post()
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([call[0] for call in throttle_cache.mock_calls],
+                         ["incr"])
+
+    @throttle_rates(token_ip="4/min", token_username="2/min")
+    def test_token(self):
+        """ Test token requests are limited per username and per IP. """
+        # Given
+        url = "/api/token/auth/"
+
+        def obtain(username, password="wrong"):
+            return self.client.post(url, {"username": username,
+                                          "password": password}).status_code
+
+        # When (the request rejected per username doesn't count per IP)
+        statuses = [obtain("throttled"), obtain("Throttled"),
+                    obtain("throttled", "password"), obtain("user1", "user1"),
+                    obtain("user2", "user2"), obtain("user1", "user1")]
+
+        # Then
+        self.assertEqual(statuses, [status.HTTP_400_BAD_REQUEST,
+                                    status.HTTP_400_BAD_REQUEST,
+                                    status.HTTP_429_TOO_MANY_REQUESTS,
+                                    status.HTTP_200_OK,
+                                    status.HTTP_200_OK,
+                                    status.HTTP_429_TOO_MANY_REQUESTS])
+
+    @throttle_rates(review_create_user="5/min")
+    def test_bulk_cost(self):
+        """ Test bulk creations take a token per review. """
+        # Given
+        review = json.loads(self.data)
+
+        # When
+        self.data = json.dumps([review] * 3)
+        statuses = [self.post().status_code, self.post().status_code]
+        self.data = json.dumps([review] * 6)
+        oversized = self.post()
+
+        # Then
+        self.assertEqual(statuses, [status.HTTP_201_CREATED,
+                                    status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(oversized.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotIn("Retry-After", oversized)
+        self.assertEqual(models.Review.objects.filter(
+            title="Throttled review").count(), 3)
+
+    @throttle_rates(review_create_user="2/min", review_create_ip="2/min")
+    def test_refund(self):
+        """ Test tokens taken by a throttle are given back on rejection. """
+        # Given
+        other_user = User.objects.get(username="user1")
+        self.post(REMOTE_ADDR="203.0.113.1")
+        self.post(REMOTE_ADDR="203.0.113.1")
+
+        # When (rejected per IP after taking a token per user)
+        rejected = self.post(other_user, REMOTE_ADDR="203.0.113.1")
+        elsewhere = [
+            self.post(other_user, REMOTE_ADDR="203.0.113.2").status_code
+            for _ in range(2)]
+
+        # Then
+        self.assertEqual(rejected.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(elsewhere, [status.HTTP_201_CREATED] * 2)
+
+    def test_first_use(self):
+        """ Test new buckets are created atomically. """
+        # Given
+        throttle = throttling.ReviewCreateUserThrottle()
+        throttle.key, throttle.now = "throttle_test", 1000
+        throttle.duration = 60
+        cache.get_cache().delete("throttle_test")
+
+        # When (another worker creates the bucket first)
+        with patch.object(throttle.cache, "add", return_value=False):
+            cache.get_cache().set("throttle_test", 1500)
+            full_at = throttle.take(100)
+
+        # Then
+        self.assertEqual(full_at, 1600)
+
+
+# Every request runs the view, and none is throttled.
+@override_settings(REVIEWS_CACHE_TIMEOUT=0,
+                   REST_FRAMEWORK=dict(settings.REST_FRAMEWORK,
+                                       DEFAULT_THROTTLE_RATES={}))
+class SQLiteConcurrencyTests(TransactionTestCase):
+    """
+    Test concurrent readers and writers of SQLite (each thread or process
+    has its own connection, so they run on committed data).
+
+    """
+    serialized_rollback = True
+
+    def setUp(self):
+        self.user = User.objects.create_user("concurrent")
+        self.company = models.Company.objects.create(name="Company C")
+
+    def tearDown(self):
+        cache.get_cache().clear()
+
+    def review(self):
+        return models.Review(rating=4,
+                             title="Concurrent review",
+                             summary="This is a test only review.",
+                             ip_address="123.123.123.123",
+                             company=self.company,
+                             reviewer=self.user)
+
+    def reconnect(self):
+        """ Reopen the connection to apply the current pragmas. """
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """ Test the pragmas are set on new connections. """
+        # Given
+        self.reconnect()
+
+        # When
+        with connection.cursor() as cursor:
+            values = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute("PRAGMA {}".format(name))
+                values[name] = cursor.fetchone()[0]
+
+        # Then
+        self.assertEqual(values, {"journal_mode": "wal",
+                                  "synchronous": 1,  # NORMAL
+                                  "busy_timeout": 5000})
+
+    def test_reader_during_write(self):
+        """ Test readers and a writer don't wait for each other. """
+        # Given
+        self.assertEqual(self.reconnect(), "wal")
+        review_count = models.Review.objects.count()
+        read, committed = threading.Event(), threading.Event()
+        counts = []
+
+        def reader():
+            # A read transaction of its own connection, open until the
+            # writer has committed.
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("BEGIN")
+                    counts.append(models.Review.objects.count())
+                    read.set()
+                    committed.wait(10)
+                    counts.append(models.Review.objects.count())
+                    cursor.execute("COMMIT")
+            finally:
+                read.set()
+                connection.close()
+
+        # When
+        thread = threading.Thread(target=reader)
+        with transaction.atomic():
+            self.review().save()
+            thread.start()
+            read_during_write = read.wait(10)
+        committed.set()
+        thread.join(10)
+
+        # Then
+        self.assertTrue(read_during_write)
+        self.assertEqual(counts, [review_count, review_count])
+        self.assertEqual(models.Review.objects.count(), review_count + 1)
+
+    def test_benchmark(self):
+        """ Test the benchmark runs parallel workers without lock errors. """
+        # Given
+        review_count = models.Review.objects.count()
+
+        # When
+        stdout = StringIO()
+        call_command("bench_sqlite", "--requests", "5", "--reviews", "30",
+                     stdout=stdout)
+        report = json.loads(stdout.getvalue())
+
+        # Then
+        self.assertEqual(report["rollback"]["journal_mode"], "delete")
+        self.assertEqual(report["configured"]["journal_mode"], "wal")
+        self.assertEqual(report["configured"]["errors"], [])
+        self.assertEqual(self.reconnect(), "wal")
+        self.assertFalse(User.objects.filter(
+            username__startswith="bench_sqlite_").exists())
+        self.assertEqual(models.Review.objects.count(), review_count)
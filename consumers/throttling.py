@@ -0,0 +1,206 @@
+import hashlib
+import ipaddress
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import settings as rest_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket holding the `N` tokens of its "N/period" rate (from the
+    `DEFAULT_THROTTLE_RATES` of its scope, no limit when missing), refilled
+    one every period / N.
+
+    The bucket is kept in the THROTTLE_CACHE as the time (ms) it will be
+    full again (the theoretical arrival time of GCRA), so taking tokens is
+    a single atomic `incr` shared by every worker (and creating the bucket
+    an atomic `add`). Requests take `get_cost` tokens, rejected requests
+    give them back, and buckets that filled up while idle are reset.
+
+    """
+    # Entries outlive their bucket (`incr` doesn't extend them), an expired
+    # one just refills the bucket early.
+    timeout_factor = 10
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    # Override
+    def get_rate(self):
+        """
+        Overriding to read the rates when used, so they can be changed
+        without restarting (e.g. in tests).
+
+        """
+        # Through the module, its `api_settings` is replaced on changes.
+        return rest_settings.api_settings.DEFAULT_THROTTLE_RATES.get(
+            self.scope)
+
+    # Override
+    def parse_rate(self, rate):
+        if rate is None:
+            return None, None
+        return super().parse_rate(rate)
+
+    # Override
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        interval = max(1, int(self.duration * 1000 / self.num_requests))
+        capacity = interval * self.num_requests
+        self.taken = 0
+        self.now = int(self.timer() * 1000)
+        amount = interval * self.get_cost(request, view)
+        if amount > capacity:
+            # More than the bucket holds, waiting won't help.
+            self.retry_at = None
+            return False
+
+        full_at = self.take(amount)
+        if full_at - self.now <= capacity:
+            self.taken = amount
+            return True
+        self.cache.decr(self.key, amount)
+        self.retry_at = full_at - capacity
+        return False
+
+    # Override
+    def wait(self):
+        if self.retry_at is None:
+            return None
+        return (self.retry_at - self.now) / 1000.0
+
+    def get_cost(self, request, view):
+        """ Tokens taken by the request. """
+        return 1
+
+    def take(self, amount):
+        """ Takes `amount` (ms) from the bucket, returns when it's full. """
+        timeout = self.duration * self.timeout_factor
+        try:
+            full_at = self.cache.incr(self.key, amount)
+        except ValueError:
+            # New bucket, unless created concurrently.
+            full_at = self.now + amount
+            if self.cache.add(self.key, full_at, timeout):
+                return full_at
+            full_at = self.cache.incr(self.key, amount)
+        if full_at - amount < self.now:
+            # Full since the last request.
+            full_at = self.now + amount
+            self.cache.set(self.key, full_at, timeout)
+        return full_at
+
+    def refund(self):
+        """
+        Gives back the tokens taken by an allowed request (rejected by
+        another throttle).
+
+        """
+        if getattr(self, "taken", 0):
+            self.cache.decr(self.key, self.taken)
+            self.taken = 0
+
+    def get_client_ip(self, request):
+        """
+        Address of the client, or of its /64 network for IPv6 (where a
+        single host usually controls the whole network).
+
+        """
+        ident = self.get_ident(request)
+        try:
+            address = ipaddress.ip_address(ident)
+        except ValueError:
+            return ident
+        if address.version == 6:
+            return str(ipaddress.ip_network(
+                "{}/64".format(address), strict=False))
+        return str(address)
+
+
+class RefundedThrottlesMixin(object):
+    """
+    View mixin giving back the tokens taken by its throttles when a later
+    one rejects the request, so only the requests served are counted.
+
+    """
+
+    # Override
+    def check_throttles(self, request):
+        allowed = []
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                for previous in allowed:
+                    if hasattr(previous, "refund"):
+                        previous.refund()
+                self.throttled(request, throttle.wait())
+            allowed.append(throttle)
+
+
+class UserThrottle(TokenBucketThrottle):
+    """ Token bucket per authenticated user (per client IP otherwise). """
+
+    # Override
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = "user:{}".format(request.user.pk)
+        else:
+            ident = "ip:{}".format(self.get_client_ip(request))
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+class IPThrottle(TokenBucketThrottle):
+    """ Token bucket per client IP (see `get_client_ip`). """
+
+    # Override
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope,
+                                    "ident": self.get_client_ip(request)}
+
+
+class ReviewCountCostMixin(object):
+    """ Takes a token per review created, from bulk POSTs too. """
+
+    # Override
+    def get_cost(self, request, view):
+        if isinstance(request.data, list):
+            return max(1, len(request.data))
+        return 1
+
+
+class ReviewCreateUserThrottle(ReviewCountCostMixin, UserThrottle):
+    scope = "review_create_user"
+
+
+class ReviewCreateIPThrottle(ReviewCountCostMixin, IPThrottle):
+    scope = "review_create_ip"
+
+
+class TokenUsernameThrottle(TokenBucketThrottle):
+    """
+    Token bucket per username tried on the token endpoint, limiting the
+    (expensive) password checks against a single account.
+
+    """
+    scope = "token_username"
+
+    # Override
+    def get_cache_key(self, request, view):
+        username = request.data.get("username") if hasattr(
+            request.data, "get") else None
+        if not username or not isinstance(username, str):
+            return None
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": hashlib.sha1(username.lower().encode()).hexdigest()}
+
+
+class TokenIPThrottle(IPThrottle):
+    scope = "token_ip"
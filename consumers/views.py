@@ -1,10 +1,57 @@
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from rest_framework import (
-    viewsets, permissions, filters as rest_filters, mixins)
+    viewsets, permissions, filters as rest_filters, mixins, status)
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_jwt import views as jwt_views
+
+from consumers import (
+    cache, companies, exports, metrics, models, serializers, filters,
+    pagination, queue, routers, throttling)
+
+
+class ObtainJSONWebToken(metrics.TimedViewMixin,
+                         throttling.RefundedThrottlesMixin,
+                         jwt_views.ObtainJSONWebToken):
+    """
+    JWT obtain endpoint, timed for the request metrics and throttled per
+    client IP and per username.
+
+    """
+    throttle_classes = (throttling.TokenIPThrottle,
+                        throttling.TokenUsernameThrottle)
+
+
+class MetricsView(APIView):
+    """
+    Metrics endpoint
+    ==========
+
+        Returns the request phase histograms of this process in the
+        Prometheus text format.
+
+        Accepts: GET (admin users only).
+
+    """
+    permission_classes = (permissions.IsAdminUser,)
 
-from consumers import models, serializers, filters
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(),
+                            content_type="text/plain; version=0.0.4")
 
 
-class ReviewViewSet(mixins.CreateModelMixin,
+class ReviewViewSet(metrics.TimedViewMixin,
+                    throttling.RefundedThrottlesMixin,
+                    routers.ReplicaReadMixin,
+                    cache.CachedResponseMixin,
+                    mixins.CreateModelMixin,
                     mixins.RetrieveModelMixin,
                     mixins.ListModelMixin,
                     viewsets.GenericViewSet):
@@ -16,39 +63,458 @@ class ReviewViewSet(mixins.CreateModelMixin,
 
         Accepts: GET, POST.
 
+        POST accepts a single review or a list of reviews, in which case the
+        valid ones are created in bulk and the result is reported per item
+        (201 when all are created, 207 when some fail, 400 when all fail).
+
+        GET responses are cached per user and carry an ETag, send it back in
+        `If-None-Match` to get a 304 while nothing changed.
+
+        Listings and details are read from a replica when configured, except
+        for a few seconds after the user writes (to see its own writes).
+
+        Listings only read the live reviews unless the archived ones are
+        asked for (see `archive_reviews`), details read both.
+
+        When REVIEWS_QUEUE_WRITES is on, a single review is queued instead
+        of created (202, with the ticket to follow it at submissions/).
+
     Params:
     -------
     - **nested**: *bool*, queryparam, Indicates if the returned structure must
         agregate data of the related entities.
+    - **cursor**: *str*, queryparam, Opaque position returned in the `next`
+        and `previous` links of a listing.
+    - **page_size**: *int*, queryparam, Amount of reviews per page.
+    - **rating**, **rating__gte**, **rating__lte**: *int*, queryparam,
+        Exact rating or rating range.
+    - **search**: *str*, queryparam, Words that must appear in the title or
+        summary, results are sorted by relevance.
+    - **fields**: *str*, queryparam, Comma separated fields to return (and
+        select), e.g. `id,title,company`; with **nested**, fields of the
+        nested objects with dots, e.g. `id,title,company.name`.
+    - **ordering**: *str*, queryparam, `submission_date` or
+        `-submission_date` (default, or relevance when searching).
+    - **submission_date__gte**, **submission_date__lte**: *datetime*,
+        queryparam, Submission date range (ISO 8601), which also reads the
+        archived reviews when it covers any.
+    - **include_archived**: *bool*, queryparam, Lists (and exports) the
+        archived reviews too, otherwise only the live ones are read.
+
+    Routes:
+    -------
+    - **export/**: Streams every review matching the listing filters.
+        Params: **output**, *str*, `ndjson` (default) or `csv`.
+    - **changes/**: Reviews created after the `cursor` (all of them when
+        missing), oldest first, with the cursor to send next time.
+        Params: **cursor**, *str*; **limit**, *int* (default 100, max 500);
+        **wait**, *float*, seconds to wait for new reviews when there are
+        none (long polling, up to REVIEWS_FEED_MAX_WAIT).
+    - **batch/**: The reviews of the given ids, in the same order, each one
+        with its status (404 when missing or not visible to the user).
+        Params: **ids**, *str*, comma separated ids (up to
+        REVIEWS_BATCH_MAX_IDS); **nested** and **fields**.
 
     """
     permission_classes = (permissions.IsAuthenticated,)
     queryset = models.Review.objects.all()
     serializer_class = serializers.ReviewSerializer
+    pagination_class = pagination.KeysetCursorPagination
     filter_backends = (filters.ReviewEndpointFilterBackend,
                        rest_filters.DjangoFilterBackend,
+                       filters.ReviewSearchFilterBackend,
                        rest_filters.OrderingFilter,)
-    filter_fields = ("company", "reviewer", "rating")
-    filter_fields = ("company", "reviewer", "rating")
+    filter_fields = {"company": ["exact"],
+                     "reviewer": ["exact"],
+                     "rating": ["exact", "gte", "lte"],
+                     "submission_date": ["gte", "lte"]}
+    # Only orderings backed by the review indexes (see Review.Meta).
+    ordering_fields = ("submission_date",)
+    create_throttle_classes = (throttling.ReviewCreateUserThrottle,
+                               throttling.ReviewCreateIPThrottle)
+    replica_actions = ("list", "retrieve", "batch")
+
+    # Override
+    def get_queryset(self):
+        """
+        Overriding to read the archived reviews too when needed, and eager
+        load what the selected serializer renders.
+
+        """
+        if self.reads_archive():
+            queryset = models.ReviewWithArchived.objects.all()
+        else:
+            queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        fields = self.get_fields()
+        if fields:
+            queryset = serializer_class.setup_eager_loading(queryset, fields)
+        elif hasattr(serializer_class, "setup_eager_loading"):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+    def reads_archive(self):
+        """
+        Whether the request reads the archived reviews too: always to find
+        them by id, and for listings and exports that ask for them or whose
+        date range covers some archived review of the user.
+
+        """
+        if self.action in ("retrieve", "batch"):
+            return True
+        if self.action not in ("list", "export"):
+            return False
+        if not hasattr(self, "_reads_archive"):
+            params = serializers.ArchiveParamsSerializer(
+                data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            start = params.validated_data.get("submission_date__gte")
+            end = params.validated_data.get("submission_date__lte")
+            dated = start is not None or end is not None
+            self._reads_archive = (
+                params.validated_data["include_archived"] or
+                (dated and models.ArchivedReview.objects.filter(
+                    reviewer=self.request.user).overlaps(start, end)))
+        return self._reads_archive
 
     # Override
     def get_serializer_class(self):
         """
-        Overriding to use custom nested serializer when requested.
+        Overriding to use custom nested serializer when requested, and the
+        values serializers (no model instances) for listings and sparse
+        fieldsets.
 
         """
-        if (self.request.method == "GET" and
-                self.request.query_params.get("nested")):
-            return serializers.ReviewNestedSerializer
-        return serializers.ReviewSerializer
+        if self.request.method != "GET":
+            return serializers.ReviewSerializer
+
+        nested = self.request.query_params.get("nested")
+        if (self.action in ("list", "changes", "batch") or
+                self.get_fields()):
+            return (serializers.ReviewNestedValuesSerializer if nested
+                    else serializers.ReviewValuesSerializer)
+        return (serializers.ReviewNestedSerializer if nested
+                else serializers.ReviewSerializer)
 
     # Override
-    def create(self, request, *args, **kwargs):
+    def get_throttles(self):
         """
-        Overriding to add user to request data.
+        Overriding to throttle the creations only (per user and per IP).
 
         """
-        request.data.update({"reviewer": self.request.user.id,
-                             "ip_address": request.META.get('REMOTE_ADDR')})
+        if self.action == "create":
+            return [throttle() for throttle in self.create_throttle_classes]
+        return super().get_throttles()
 
+    # Override
+    def get_serializer(self, *args, **kwargs):
+        """
+        Overriding to pass the sparse fieldset to the values serializers.
+
+        """
+        fields = self.get_fields()
+        if fields:
+            kwargs["fields"] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def get_fields(self):
+        """ Tree of the fields requested by a GET (None for all of them). """
+        value = self.request.query_params.get("fields")
+        if self.request.method != "GET" or not value:
+            return None
+        return serializers.parse_fields(value)
+
+    # Override
+    def create(self, request, *args, **kwargs):
+        """
+        Overriding to create a list of reviews in bulk.
+
+        """
+        if isinstance(request.data, list):
+            return self.bulk_create(request)
+        if settings.REVIEWS_QUEUE_WRITES:
+            return self.enqueue(request)
         return super().create(request, *args, **kwargs)
+
+    # Override
+    def perform_create(self, serializer):
+        """
+        Overriding to add user and its address to the review (the user is
+        already loaded by the authentication, so it's not looked up again).
+
+        """
+        serializer.save(**self.get_reviewer_data())
+
+    @list_route(methods=["get"])
+    def export(self, request):
+        """
+        Streams the filtered reviews without building them all in memory.
+
+        """
+        output = request.query_params.get("output", "ndjson")
+        if output not in exports.FORMATS:
+            raise ValidationError({"output": ["Expected one of: {}.".format(
+                ", ".join(sorted(exports.FORMATS)))]})
+
+        fields = self.get_fields()
+        serializer = serializers.ReviewValuesSerializer(fields=fields)
+        queryset = serializer.setup_eager_loading(
+            self.filter_queryset(self.get_queryset()), fields)
+        rows = exports.iter_rows(queryset, settings.REVIEWS_EXPORT_CHUNK_SIZE)
+        stream, content_type = exports.FORMATS[output]
+        response = StreamingHttpResponse(stream(rows, serializer),
+                                         content_type=content_type)
+        response["Content-Disposition"] = (
+            'attachment; filename="reviews.{}"'.format(output))
+        return response
+
+    @list_route(methods=["get"])
+    def changes(self, request):
+        """
+        Returns the reviews inserted after the cursor, in insert order.
+
+        The feed seeks on the id rather than the submission date, which
+        queued and loaded reviews set in the past: ids are handed out under
+        SQLite's write lock, so they grow in commit order.
+
+        """
+        params = serializers.ChangesParamsSerializer(
+            data=request.query_params)
+        params.is_valid(raise_exception=True)
+        after = params.validated_data.get("cursor", 0)
+        limit = params.validated_data["limit"]
+        wait = min(params.validated_data["wait"],
+                   settings.REVIEWS_FEED_MAX_WAIT)
+
+        queryset = pagination.with_ordering_columns(
+            self.filter_queryset(self.get_queryset()).filter(
+                id__gt=after).order_by("id"), ["id"])
+        # Read before the reviews, so none created meanwhile is missed.
+        version = cache.get_version(request.user.pk)
+        reviews = list(queryset[:limit + 1])
+        deadline = time.monotonic() + wait
+        while not reviews and cache.wait_for_change(
+                request.user.pk, version, deadline - time.monotonic()):
+            version = cache.get_version(request.user.pk)
+            reviews = list(queryset[:limit + 1])
+
+        page = reviews[:limit]
+        return Response(OrderedDict([
+            ("cursor", serializers.encode_changes_cursor(
+                page[-1]["id"] if page else after)),
+            ("has_more", len(reviews) > limit),
+            ("results", self.get_serializer(page, many=True).data),
+        ]))
+
+    @list_route(methods=["get"])
+    def batch(self, request):
+        """
+        Returns the reviews of the `ids` param, taken from the per-review
+        cache or else loaded in a single query.
+
+        """
+        params = serializers.BatchParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ids = params.validated_data["ids"]
+
+        variant = [self.get_serializer_class().__name__,
+                   request.query_params.get("fields", "")]
+        found = cache.get_items(request.user, variant, ids)
+        missing = set(ids).difference(found)
+        if missing:
+            queryset = filters.ReviewEndpointFilterBackend().filter_queryset(
+                request, self.get_queryset(), self)
+            rows = list(pagination.with_ordering_columns(
+                queryset.filter(id__in=missing).order_by(), ["id"]))
+            loaded = dict(zip((row["id"] for row in rows),
+                              self.get_serializer(rows, many=True).data))
+            cache.set_items(request.user, variant, loaded)
+            found.update(loaded)
+
+        results = []
+        for review_id in ids:
+            if review_id in found:
+                results.append({"id": review_id,
+                                "status": status.HTTP_200_OK,
+                                "data": found[review_id]})
+            else:
+                results.append({"id": review_id,
+                                "status": status.HTTP_404_NOT_FOUND,
+                                "errors": {"detail": "Not found."}})
+        return Response(results)
+
+    def get_reviewer_data(self):
+        """ Data of the review set from the request instead of the payload. """
+        return {"reviewer": self.request.user,
+                "ip_address": self.request.META.get('REMOTE_ADDR')}
+
+    def enqueue(self, request):
+        """
+        Validates the review and queues it for `process_review_queue`,
+        returning its ticket without waiting for the review to be created.
+
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        submission = queue.enqueue(serializer, **self.get_reviewer_data())
+        data = serializers.ReviewSubmissionSerializer(
+            submission, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_202_ACCEPTED,
+                        headers={"Location": data["url"]})
+
+    def bulk_create(self, request):
+        """
+        Validates all the reviews (loading their uncached companies in one
+        query) and inserts the valid ones in a single transaction.
+
+        """
+        items = request.data
+        if not items:
+            raise ValidationError(["Expected a non-empty list of reviews."])
+        if len(items) > settings.REVIEWS_BULK_MAX_ITEMS:
+            raise ValidationError(["Expected at most {} reviews.".format(
+                settings.REVIEWS_BULK_MAX_ITEMS)])
+
+        company_ids = set()
+        for item in items:
+            try:
+                company_ids.add(int(item.get("company")))
+            except (AttributeError, TypeError, ValueError):
+                pass
+
+        context = self.get_serializer_context()
+        context["companies"] = companies.company_cache.get_many(company_ids)
+        serializer_class = self.get_serializer_class()
+        item_serializers = [serializer_class(data=item, context=context)
+                            for item in items]
+
+        reviewer_data = self.get_reviewer_data()
+        reviews = [models.Review(**dict(serializer.validated_data,
+                                        **reviewer_data))
+                   for serializer in item_serializers
+                   if serializer.is_valid()]
+        with transaction.atomic():
+            reviews = models.Review.objects.bulk_create(reviews)
+
+        results = []
+        created = iter(reviews)
+        for serializer in item_serializers:
+            if serializer.errors:
+                results.append({"status": status.HTTP_400_BAD_REQUEST,
+                                "errors": serializer.errors})
+            else:
+                results.append({"status": status.HTTP_201_CREATED,
+                                "data": serializer_class(
+                                    next(created), context=context).data})
+
+        if len(reviews) == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif reviews:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=response_status)
+
+
+class ReviewSubmissionViewSet(mixins.RetrieveModelMixin,
+                              viewsets.GenericViewSet):
+    """
+    Review submissions endpoint
+    ==========
+
+        Returns the status of a review queued by the reviews endpoint
+        (`pending`, `created` with its review id, or `failed` with the
+        validation errors), by its ticket.
+
+        Accepts: GET.
+
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    queryset = models.ReviewSubmission.objects.all()
+    serializer_class = serializers.ReviewSubmissionSerializer
+    lookup_field = "ticket"
+    lookup_value_regex = "[0-9a-f]{8}(-?[0-9a-f]{4}){3}-?[0-9a-f]{12}"
+
+    # Override
+    def get_queryset(self):
+        """
+        Overriding to only return the submissions of the user.
+
+        """
+        return super().get_queryset().filter(reviewer=self.request.user)
+
+
+class CompanyViewSet(viewsets.GenericViewSet):
+    """
+    Companies endpoint
+    ==========
+
+        Returns companies, looked up by id or by the start of their name
+        (served from the company cache), and their review statistics
+        (precomputed on every review insert, never aggregated on request).
+
+        Accepts: GET.
+
+    Routes:
+    -------
+    - **/**: Companies whose name starts with `prefix` (ignoring case),
+        sorted by name.
+    - **{id}/**: A company.
+    - **{id}/stats/**: Review count, average rating and rating histogram of
+        a company.
+    - **leaderboard/**: Companies sorted by their average rating.
+
+    Params (list):
+    -------
+    - **prefix**: *str*, queryparam, Start of the names (all when missing).
+    - **limit**: *int*, queryparam, Amount of companies (default 10, max 100).
+
+    Params (leaderboard):
+    -------
+    - **limit**: *int*, queryparam, Amount of companies (default 10, max 100).
+    - **min_reviews**: *int*, queryparam, Reviews a company needs to be
+        ranked (default 1).
+
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    queryset = models.Company.objects.select_related("stats")
+    serializer_class = serializers.CompanySerializer
+    lookup_value_regex = "[0-9]+"
+
+    def list(self, request):
+        params = serializers.CompanyAutocompleteParamsSerializer(
+            data=request.query_params)
+        params.is_valid(raise_exception=True)
+        results = companies.company_cache.autocomplete(
+            params.validated_data.get("prefix", ""),
+            params.validated_data["limit"])
+        return Response(self.get_serializer(results, many=True).data)
+
+    def retrieve(self, request, pk=None):
+        company = companies.company_cache.get(int(pk))
+        if company is None:
+            raise Http404
+        return Response(self.get_serializer(company).data)
+
+    @detail_route(methods=["get"])
+    def stats(self, request, pk=None):
+        company = self.get_object()
+        try:
+            stats = company.stats
+        except models.CompanyStats.DoesNotExist:
+            stats = models.CompanyStats(company=company)
+        return Response(serializers.CompanyStatsSerializer(stats).data)
+
+    @list_route(methods=["get"])
+    def leaderboard(self, request):
+        params = serializers.LeaderboardParamsSerializer(
+            data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        queryset = models.CompanyStats.objects.select_related(
+            "company").filter(
+                review_count__gte=params.validated_data["min_reviews"]
+            ).order_by("-rating_average", "-review_count")
+        queryset = queryset[:params.validated_data["limit"]]
+        return Response(
+            serializers.CompanyStatsSerializer(queryset, many=True).data)